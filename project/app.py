@@ -1,15 +1,24 @@
+# Part of the Python Standard Library
+import logging
+
 # Created by third-parties
 from flask import Flask
 
 # Created by me
 from tools import clearSession
+from querystats import queryStats
+from pages.webpage import closeRequestDatabase
 import pages.general as general
 import pages.customer as customer
 import pages.manager as manager
+import pages.api as api
 
 
 app = Flask(__name__)      # Creates the Flask object
 app.config["SECRET_KEY"] = "dfb8c0a70337b414" # This random string allows us to store session variables securely
+app.teardown_appcontext(closeRequestDatabase)   # Each request's database connection is returned to the pool when the request ends
+queryStats.slowThreshold = 0.5  # Queries that take longer than this many seconds are logged as slow
+logging.basicConfig(format="%(asctime)s %(name)s %(levelname)s: %(message)s")  # Sends the slow query log to the console
 
 
 # Configure endpoints for all webpages in the application
@@ -37,6 +46,12 @@ def customerHome():
     return page.run()
 
 
+@app.route("/bulk-order", methods=["GET", "POST"])
+def bulkOrder():
+    page = customer.BulkOrder()
+    return page.run()
+
+
 @app.route("/delete-order", methods=["POST"])
 def deleteOrder():
     page = customer.DeleteOrder()
@@ -206,6 +221,43 @@ def predictOrders():
     return page.run()
 
 
+@app.route("/predict-orders/compare", methods=["GET", "POST"])
+def predictOrdersCompare():
+    page = manager.PredictOrdersCompare()
+    return page.run()
+
+
+@app.route("/diagnostics", methods=["GET", "POST"])
+def diagnostics():
+    page = manager.Diagnostics()
+    return page.run()
+
+
+# The customer API, for clients that want JSON instead of webpages. Clients log in through /login first
+@app.route("/api/week")
+def apiWeek():
+    page = api.ApiWeek()
+    return page.run()
+
+
+@app.route("/api/menu/<int:dateTS>")
+def apiMenu(dateTS):
+    page = api.ApiMenu()
+    return page.run(dateTS)
+
+
+@app.route("/api/orders", methods=["POST"])
+def apiAddOrder():
+    page = api.ApiAddOrder()
+    return page.run()
+
+
+@app.route("/api/orders/<int:orderID>", methods=["PUT", "DELETE"])
+def apiOrder(orderID):
+    page = api.ApiOrder()
+    return page.run(orderID)
+
+
 @app.route("/logout")
 def logout():
     return clearSession()
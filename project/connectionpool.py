@@ -0,0 +1,124 @@
+# Part of the Python Standard Library
+import os
+import time
+import threading
+
+
+
+class PoolExhaustedError(Exception):
+    """Raised when every connection in a pool is in use and none is returned in time"""
+    pass
+
+
+
+class ConnectionPool():
+    """Keeps database connections open between queries so that they can be shared by every request in this process"""
+
+    def __init__(self, connect, maxSize=10, maxIdleTime=300, checkInterval=5, timeout=10):
+        """Constructor method for the ConnectionPool class"""
+        self.connect = connect      # Function that opens a new connection
+        self.maxSize = maxSize      # The most connections that can be open at once, including ones that are in use
+        self.maxIdleTime = maxIdleTime  # Connections that haven't been used for this many seconds are closed
+        self.checkInterval = checkInterval  # Connections that were returned less than this many seconds ago are trusted without pinging them
+        self.timeout = timeout      # How many seconds to wait for a connection to be returned when the pool is full
+        self.condition = threading.Condition()  # Requests on other threads are woken up when a connection is returned
+        self.reset()
+
+    def reset(self):
+        """Forgets every connection in the pool without closing them"""
+        self.idle = []      # List of (connection, time it was returned) pairs, with the most recently used at the end
+        self.size = 0       # The number of connections that are open, whether they are idle or in use
+        self.pid = os.getpid()
+
+    def checkPid(self):
+        """Makes sure we don't share connections with the process that we were forked from"""
+        if os.getpid() != self.pid:     # The connections belong to the parent process, so closing them here would close them for the parent too
+            self.reset()
+
+    def closeConn(self, conn):
+        """Closes a connection that is leaving the pool"""
+        self.size -= 1
+        try:
+            conn.close()
+        except Exception:   # The connection might already be broken, in which case there is nothing left to close
+            pass
+        self.condition.notify()     # A request waiting for space in the pool can now open a new connection
+
+    def evictIdle(self):
+        """Closes the connections that have been idle for too long"""
+        now = time.time()
+        while len(self.idle) > 0 and now - self.idle[0][1] > self.maxIdleTime:  # The oldest connections are at the start of the list
+            conn = self.idle.pop(0)[0]
+            self.closeConn(conn)
+
+    def isHealthy(self, conn, lastUsed):
+        """Checks whether an idle connection can still be used"""
+        if time.time() - lastUsed < self.checkInterval:
+            return True
+        try:
+            conn.ping(False)    # The server may have closed the connection while it was idle
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Borrows a connection from the pool, opening a new one if none are idle"""
+        deadline = time.time() + self.timeout
+        with self.condition:
+            self.checkPid()
+            self.evictIdle()
+            while True:
+                while len(self.idle) > 0:
+                    conn, lastUsed = self.idle.pop()    # The most recently used connection is the least likely to have timed out
+                    if self.isHealthy(conn, lastUsed):
+                        return conn
+                    self.closeConn(conn)
+
+                if self.size < self.maxSize:
+                    self.size += 1  # We reserve the space before connecting, so that other threads can't take it while we wait for the server
+                    break
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PoolExhaustedError("All " + str(self.maxSize) + " database connections are in use")
+                self.condition.wait(remaining)
+
+        try:
+            return self.connect()   # Connecting happens outside of the lock, so other threads can still borrow idle connections
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        """Returns a borrowed connection to the pool, or closes it if it is broken"""
+        with self.condition:
+            if os.getpid() != self.pid:     # The connection was borrowed before a fork, so this process's pool never counted it
+                return
+            if discard:
+                self.closeConn(conn)
+            else:
+                self.idle.append((conn, time.time()))
+                self.condition.notify()
+            self.evictIdle()
+
+    def closeAll(self):
+        """Closes every idle connection in the pool"""
+        with self.condition:
+            self.checkPid()
+            while len(self.idle) > 0:
+                conn = self.idle.pop()[0]
+                self.closeConn(conn)
+
+
+
+pools = {}  # One pool for each database, shared by every request in this process
+poolsLock = threading.Lock()
+
+def getPool(key, connect, maxSize=10):
+    """Gets the connection pool for the database identified by key, creating it with the connect function if it doesn't exist yet"""
+    with poolsLock:
+        if key not in pools:
+            pools[key] = ConnectionPool(connect, maxSize)
+        return pools[key]
@@ -1,37 +1,170 @@
+# Part of the Python Standard Library
+import os
+import time
+
 # Created by third-parties
 import pymysql
-from pymysql.cursors import DictCursor
+from pymysql.constants import CLIENT
+from pymysql.cursors import DictCursor, SSCursor, SSDictCursor
+
+# Created by me
+from connectionpool import getPool
+from queries import Query
+from querystats import queryStats
+from sqlitedb import SQLiteConnection
+
+SQLITE_PATH = os.environ.get("CAFETERIA_SQLITE")    # If this is set, every Database object uses this SQLite file (or ":memory:") instead of the MySQL server
 
 class Database():
-    
-    def __init__(self, hostname, user, password, dbname):
-        """Database constructor method"""
+
+    def __init__(self, hostname, user, password, dbname, keepOpen=False, source="Unknown", backend="mysql"):
+        """Database constructor method. If backend is "sqlite", then dbname is the path of the SQLite file and the other details are ignored"""
+        if SQLITE_PATH is not None:
+            backend = "sqlite"
+            dbname = SQLITE_PATH
         self.hostname = hostname
         self.user = user
         self.password = password
         self.dbname = dbname
+        self.backend = backend
         self.conn = None
         self.cursor = None
+        self.keepOpen = keepOpen    # If True, the connection is kept between queries until closeConn is called, rather than being returned after each one
+        self.inTransaction = False  # The connection is also kept while a transaction is open
+        self.rowCount = 0   # The number of rows that the last query matched or returned
+        self.source = source    # The name of the page or class running the queries, which the query statistics are grouped by
+        self.sharedConn = backend == "sqlite" and dbname == ":memory:"     # There is only one in-memory database, so only one request can use it at a time
+        if self.sharedConn:
+            self.pool = getPool((backend, dbname), self.connect, maxSize=1)
+        else:
+            self.pool = getPool((backend, hostname, user, dbname), self.connect)   # Every Database object for the same database shares one pool of connections
+
+    def connect(self):
+        """Opens a new connection to the database for the pool"""
+        if self.backend == "sqlite":
+            return SQLiteConnection(self.dbname)
+        # Pages check rowCount to see whether a conditional update, such as a payment, went through. MySQL normally only counts the rows whose values changed,
+        # so an update that leaves the balance the same, such as changing to an option with the same price, would look like it failed. SQLite already counts matched rows
+        return pymysql.connect(self.hostname, self.user, self.password, self.dbname, cursorclass=DictCursor, autocommit=True, client_flag=CLIENT.FOUND_ROWS)
 
     def openConn(self):
-        """Opens connection to the database"""
+        """Borrows a connection to the database from the pool"""
         if self.conn is None:
-            self.conn = pymysql.connect(self.hostname, self.user, self.password, self.dbname, cursorclass=DictCursor, autocommit=True)
+            self.conn = self.pool.acquire()
             self.cursor = self.conn.cursor()    # Creates a cursor object, which we can interface the database with
 
-    def closeConn(self):
-        """Closes connection to the database"""
+    def closeConn(self, discard=False):
+        """Returns the connection to the pool, or closes it for good if discard is True"""
         if self.conn is not None:
-            self.conn.close()
+            try:
+                self.cursor.close()
+                if self.inTransaction:  # A transaction that was never committed must not carry over to whoever borrows the connection next
+                    self.conn.rollback()
+            except Exception:   # A cursor on a broken connection can't be closed cleanly, so the connection can't be reused either
+                discard = True
+            self.inTransaction = False
+            self.pool.release(self.conn, discard)
             self.conn = None    # Makes sure that the conn property is set to None in case we want to use the openConn method
-        
+            self.cursor = None
+
+    def beginTransaction(self):
+        """Starts a transaction, so that the following queries are saved together by commit or undone together by rollback"""
+        self.openConn()
+        self.conn.begin()
+        self.inTransaction = True
+
+    def commit(self):
+        """Saves the changes made in the current transaction"""
+        if self.inTransaction:
+            self.conn.commit()
+            self.inTransaction = False
+            if not self.keepOpen:
+                self.closeConn()
+
+    def rollback(self):
+        """Undoes the changes made in the current transaction"""
+        if self.inTransaction:
+            self.conn.rollback()
+            self.inTransaction = False
+            if not self.keepOpen:
+                self.closeConn()
+
     def executeQuery(self, query, params=None, close=True):
+        """Runs a query, which is either an SQL string or a Query from the queries module, and returns every record"""
+        name = None
+        if isinstance(query, Query):    # Registered queries are counted under their name in the query statistics
+            name = query.name
+            query = query.sql
+        startTime = time.time()
         self.openConn()     # Opens the database connection
-        self.cursor.execute(query, params)      # Executes the query as a parameterised SQL query
-        data = self.cursor.fetchall()      # This returns a list containing each record in the form of a dictionary
-        if close:
-            self.closeConn()    # Closes the database connection
+        connectedTime = time.time()
+        try:
+            self.rowCount = self.cursor.execute(query, params)      # Executes the query as a parameterised SQL query
+            executedTime = time.time()
+            data = self.cursor.fetchall()      # This returns a list containing each record in the form of a dictionary
+            fetchedTime = time.time()
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            self.closeConn(discard=True)    # The connection itself has failed, so it mustn't go back into the pool
+            raise
+        except Exception:
+            self.closeConn()    # Errors such as a duplicate key leave the connection usable
+            raise
+        queryStats.record(query, self.source, connectedTime - startTime, executedTime - connectedTime, fetchedTime - executedTime, self.rowCount, name)
+        if close and not self.keepOpen and not self.inTransaction:
+            self.closeConn()    # Returns the connection to the pool
         if len(data) > 0:
             return data     # Returns the data that we needed
         else:
             return []
+
+    def iterQuery(self, query, params=None, batchSize=1000, tuples=False, batches=False):
+        """Runs a query and yields its records as they arrive from the server, rather than loading every record into memory first.
+        Records are read batchSize at a time. If tuples is True, each record is a tuple in the order of the selected columns instead of a dictionary.
+        If batches is True, each batch is yielded as a list instead of yielding one record at a time.
+        The records are read on their own pooled connection, so other queries can still be run while iterating.
+        The in-memory database only has one connection, so if this object is already holding it, the records are read on that connection instead.
+        """
+        name = None
+        if isinstance(query, Query):
+            name = query.name
+            query = query.sql
+        startTime = time.time()
+        borrowed = not (self.sharedConn and self.conn is not None)    # Waiting for the pool would never finish if we are the ones holding its only connection
+        if borrowed:
+            conn = self.pool.acquire()
+        else:
+            conn = self.conn
+        connectedTime = time.time()
+        if tuples:
+            cursor = conn.cursor(SSCursor)  # An unbuffered cursor only holds one batch at a time, and tuples avoid building a dictionary per record
+        else:
+            cursor = conn.cursor(SSDictCursor)
+        discard = False
+        rows = 0
+        fetchTime = 0.0
+        try:
+            cursor.execute(query, params)
+            executedTime = time.time()
+            while True:
+                fetchStart = time.time()
+                batch = cursor.fetchmany(batchSize)
+                fetchTime += time.time() - fetchStart   # The time spent by the caller between batches isn't counted
+                if not batch:
+                    break
+                rows += len(batch)
+                if batches:
+                    yield batch
+                else:
+                    for row in batch:
+                        yield row
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            discard = True  # The connection itself has failed, so it mustn't go back into the pool
+            raise
+        finally:
+            try:
+                cursor.close()  # If the caller stopped early, this reads and throws away the remaining records so that the connection can be reused
+            except Exception:
+                discard = True
+            if borrowed:
+                self.pool.release(conn, discard)
+        queryStats.record(query, self.source, connectedTime - startTime, executedTime - connectedTime, fetchTime, rows, name)
@@ -0,0 +1,243 @@
+# Part of the Python Standard Library
+import os
+import re
+import time
+
+# Created by me
+from database import Database
+from sqlitedb import translateScript
+from queries import optionAllergenMaskSQL, studentAllergenMaskSQL
+
+
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "testing", "data", "tables.sql")  # The original table definitions, which the first migration creates
+
+# Gives each allergen its own bit, in order of ID, and works out every allergen mask from the bits. The masks are 64 bit integers, so there can be at most 63 allergens
+ALLERGEN_MASK_STATEMENTS = [
+    """
+        UPDATE allergens
+        SET maskBit = (
+            SELECT COUNT(*)
+            FROM (SELECT allergenID FROM allergens) AS earlier
+            WHERE earlier.allergenID < allergens.allergenID)
+    """,
+    "UPDATE options SET allergenMask = " + optionAllergenMaskSQL,
+    "UPDATE students SET allergenMask = " + studentAllergenMaskSQL,
+]
+
+# Each migration is a (version, description, statements) tuple, and they are applied in order of version
+# Every statement must run on both MySQL and SQLite
+MIGRATIONS = [
+    (1, "Create the original tables", None),    # None means the tables are created from SCHEMA_PATH, unless they already exist
+    (2, "Add indexes for the columns that pages filter and join on", [
+        "CREATE INDEX orders_student_day ON orders (studentID, dayID)",     # Also covers lookups by studentID alone
+        "CREATE INDEX orders_day_option ON orders (dayID, optionID)",   # Also covers lookups by dayID alone
+        "CREATE INDEX orders_option ON orders (optionID)",
+        "CREATE INDEX menu_options_day_option ON menu_options (dayID, optionID)",
+        "CREATE INDEX menu_options_option ON menu_options (optionID)",
+        "CREATE INDEX option_ingredients_option ON option_ingredients (optionID)",
+        "CREATE INDEX student_allergens_student ON student_allergens (studentID)",
+        "CREATE INDEX ingredient_allergens_ingredient ON ingredient_allergens (ingredientID)",
+    ]),
+    (3, "Merge days with the same timestamp and make days.timestamp unique", [
+        # Orders and menus for a duplicate day are moved to the first day with that timestamp
+        """
+            UPDATE orders
+            SET dayID = (
+                SELECT MIN(sameDays.dayID)
+                FROM days, days AS sameDays
+                WHERE days.dayID = orders.dayID
+                AND sameDays.timestamp = days.timestamp)
+        """,
+        """
+            UPDATE menu_options
+            SET dayID = (
+                SELECT MIN(sameDays.dayID)
+                FROM days, days AS sameDays
+                WHERE days.dayID = menu_options.dayID
+                AND sameDays.timestamp = days.timestamp)
+        """,
+        # The first day keeps a temperature from one of its duplicates if it doesn't have one. MySQL can't read from the table it is updating, so the days are copied into a derived table first
+        """
+            UPDATE days
+            SET temperature = (
+                SELECT MAX(sameDays.temperature)
+                FROM (SELECT timestamp, temperature FROM days) AS sameDays
+                WHERE sameDays.timestamp = days.timestamp)
+            WHERE temperature IS NULL
+        """,
+        """
+            DELETE FROM days
+            WHERE dayID NOT IN (
+                SELECT dayID
+                FROM (SELECT MIN(dayID) AS dayID FROM days GROUP BY timestamp) AS firstDays)
+        """,
+        "CREATE UNIQUE INDEX days_timestamp ON days (timestamp)",  # Every lookup of a day by its timestamp now uses this index
+    ]),
+    (4, "Store the allergens of each option and student as a bitmask", [
+        "ALTER TABLE allergens ADD COLUMN maskBit int NOT NULL default 0",
+        "ALTER TABLE options ADD COLUMN allergenMask bigint NOT NULL default 0",
+        "ALTER TABLE students ADD COLUMN allergenMask bigint NOT NULL default 0",
+    ] + ALLERGEN_MASK_STATEMENTS),
+]
+
+
+
+def splitScript(script):
+    """Splits an SQL script into its statements, leaving out comments"""
+    script = re.sub(r"--.*", "", script)
+    return [statement.strip() for statement in script.split(";") if statement.strip()]
+
+
+
+def tableExists(db, table):
+    """Checks whether a table exists in the database"""
+    try:
+        db.executeQuery("SELECT 1 FROM " + table + " LIMIT 1")
+        return True
+    except Exception:   # MySQL and SQLite raise different errors for a missing table
+        return False
+
+
+
+def indexExists(db, table, index):
+    """Checks whether a table has an index with the given name"""
+    if db.backend == "sqlite":
+        indexQuery = """
+            SELECT 1
+            FROM sqlite_master
+            WHERE type = 'index'
+            AND tbl_name = %s
+            AND name = %s
+        """
+    else:
+        indexQuery = """
+            SELECT 1
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE()
+            AND table_name = %s
+            AND index_name = %s
+            LIMIT 1
+        """
+    indexQueryParams = (table, index)
+    return len(db.executeQuery(indexQuery, indexQueryParams)) > 0
+
+
+
+def columnExists(db, table, column):
+    """Checks whether a table has a column with the given name"""
+    if db.backend == "sqlite":
+        return any(row['name'] == column for row in db.executeQuery("PRAGMA table_info(" + table + ")"))
+    columnQuery = """
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+        AND table_name = %s
+        AND column_name = %s
+    """
+    columnQueryParams = (table, column)
+    return len(db.executeQuery(columnQuery, columnQueryParams)) > 0
+
+
+
+def alreadyDone(db, statement):
+    """Checks whether a statement that adds an index or a column has already been carried out, so that a migration that failed part way through can be tried again"""
+    match = re.match(r"\s*CREATE (?:UNIQUE )?INDEX (\w+) ON (\w+)", statement)
+    if match:
+        return indexExists(db, match.group(2), match.group(1))
+    match = re.match(r"\s*ALTER TABLE (\w+) ADD COLUMN (\w+)", statement)
+    if match:
+        return columnExists(db, match.group(1), match.group(2))
+    return False    # Other statements, such as updates, can safely be run again
+
+
+
+def getAppliedVersions(db):
+    """Gets the set of migration versions that have already been applied, creating the table that records them if it doesn't exist"""
+    if not tableExists(db, "schema_migrations"):
+        createQuery = """
+            CREATE TABLE schema_migrations (
+                version int NOT NULL,
+                description char(100) NOT NULL default '',
+                appliedAt int NOT NULL default 0,
+                PRIMARY KEY (version)
+            )
+        """
+        db.executeQuery(createQuery)
+    versionsQuery = """
+        SELECT version
+        FROM schema_migrations
+    """
+    return set(row['version'] for row in db.executeQuery(versionsQuery))
+
+
+
+def createTables(db):
+    """Creates the original tables from SCHEMA_PATH, if the database doesn't have them yet"""
+    if tableExists(db, "students"):     # Databases from before migrations existed already have the original tables
+        return
+    with open(SCHEMA_PATH) as schemaFile:
+        script = schemaFile.read()
+    if db.backend == "sqlite":
+        script = translateScript(script)
+    for statement in splitScript(script):
+        db.executeQuery(statement)
+
+
+
+def refreshAllergenMasks(db):
+    """Works out every allergen mask again, for example after allergens, students or ingredients have been added with SQL rather than through the pages"""
+    db.beginTransaction()
+    try:
+        for statement in ALLERGEN_MASK_STATEMENTS:
+            db.executeQuery(statement)
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+
+
+
+def migrate(db, target=None):
+    """Applies every migration that hasn't been applied yet, up to and including version target, returning the versions that were applied"""
+    applied = getAppliedVersions(db)
+    newlyApplied = []
+    for version, description, statements in MIGRATIONS:
+        if version in applied or (target is not None and version > target):
+            continue
+
+        if statements is None:
+            createTables(db)
+        else:
+            # SQLite undoes the whole migration if a statement fails. MySQL commits each index and column as soon as it is added, so when a version that wasn't recorded is tried again, anything it already added is skipped
+            db.beginTransaction()
+            try:
+                for statement in statements:
+                    if not alreadyDone(db, statement):
+                        db.executeQuery(statement)
+            except Exception:
+                db.rollback()
+                raise
+            db.commit()
+
+        recordQuery = """
+            INSERT INTO schema_migrations
+            VALUES (%s, %s, %s)
+        """
+        recordQueryParams = (version, description, int(time.time()))
+        db.executeQuery(recordQuery, recordQueryParams)
+        newlyApplied.append(version)
+
+    return newlyApplied
+
+
+
+if __name__ == "__main__":
+    # Brings the database up to date, for example after updating the code on the server
+    db = Database("localhost", "pi", "raspberry", "cafeteria", source="Migrations")
+    versions = migrate(db)
+    if versions:
+        print("Applied migrations " + ", ".join(str(version) for version in versions))
+    else:
+        print("The database is already up to date")
+    refreshAllergenMasks(db)    # Data loaded straight into the database doesn't update the masks
@@ -0,0 +1,358 @@
+# Part of the Python Standard Library
+import os
+import json
+import binascii
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl    # Only available on Unix, where the app is served by several processes
+except ImportError:
+    fcntl = None
+
+
+
+RECONCILE_INTERVAL = 900    # The most seconds the tallies are kept before they are calculated again from the database, which corrects any change that a page failed to record
+
+
+
+class ModelState():
+    """Compact summary of the order history that the predictor needs, kept up to date as orders and menus change.
+    A day only becomes part of the history once its temperature has been recorded and it is before beforeTS, since the predictor only uses days before the day it predicts for.
+    """
+
+    def __init__(self, path):
+        """Constructor method for the ModelState class"""
+        self.path = path    # The snapshot file that the state is saved to, or None to keep it in memory only
+        self.lock = threading.RLock()   # Pages can run on several threads at once, so updates must not interleave
+        self.fileStamp = None   # Identifies the snapshot file as we last read or wrote it, so that we can tell when another process has saved it
+        self.lockFile = None    # The open lock file while this process holds the lock on the snapshot
+        self.lockDepth = 0  # How many changes this thread is nested inside, so that the lock is only taken once
+        self.builtAt = 0    # When the tallies were last calculated from the database
+        self.prefix = binascii.hexlify(os.urandom(4))   # Starts every version this process gives out, so two processes can never save the same version with different tallies
+        self.counter = 0
+        self.version = self.prefix + "-0"   # Changes every time the tallies change, so that cached predictions can tell whether they are out of date
+        self.beforeTS = None    # Only days before this timestamp are in the history, or every day if it is None
+        self.clear()
+
+    def clear(self):
+        """Empties all of the tallies"""
+        self.dayTemps = {}  # Maps the timestamp of each day in the history to the temperature on that day
+        self.studentOrders = {}     # Maps each student ID to the number of orders they have placed
+        self.orderTallies = {}  # Maps each student ID to a dictionary mapping (option ID, temperature) to the number of orders
+        self.menuTallies = {}   # Maps (option ID, temperature) to the number of menus the option was available in
+
+    def getNumMenus(self):
+        """Gets the number of menus in the history"""
+        return len(self.dayTemps)
+
+    def isTracked(self, dateTS):
+        """Checks whether the day is part of the history"""
+        return int(dateTS) in self.dayTemps
+
+    def tallyOrder(self, studentID, optionID, temp, amount):
+        """Adds amount to the tallies for an order"""
+        self.studentOrders[studentID] = self.studentOrders.get(studentID, 0) + amount
+        if self.studentOrders[studentID] <= 0:
+            del self.studentOrders[studentID]
+
+        tallies = self.orderTallies.setdefault(studentID, {})
+        key = (optionID, temp)
+        tallies[key] = tallies.get(key, 0) + amount
+        if tallies[key] <= 0:   # We don't keep empty tallies, so the state stays as small as possible
+            del tallies[key]
+            if not tallies:
+                del self.orderTallies[studentID]
+
+    def tallyMenuOption(self, optionID, temp, amount):
+        """Adds amount to the tally for an option being available in a menu"""
+        key = (optionID, temp)
+        self.menuTallies[key] = self.menuTallies.get(key, 0) + amount
+        if self.menuTallies[key] <= 0:
+            del self.menuTallies[key]
+
+    def isInHistory(self, dateTS):
+        """Checks whether a day is early enough to be part of the history, once its temperature is recorded"""
+        return self.beforeTS is None or int(dateTS) < self.beforeTS
+
+    def readTallies(self, db, fromTS=None, beforeTS=None):
+        """Gets the days, order tallies and menu tallies for the days with a temperature from fromTS up to, but not including, beforeTS.
+        The database groups the orders and menus itself, so we only receive one row for each distinct combination instead of every order.
+        """
+        cutoff = ""
+        params = []
+        if fromTS is not None:
+            cutoff += " AND days.timestamp >= %s"
+            params.append(fromTS)
+        if beforeTS is not None:
+            cutoff += " AND days.timestamp < %s"
+            params.append(beforeTS)
+        params = tuple(params) or None
+
+        daysQuery = """
+            SELECT timestamp, temperature
+            FROM days
+            WHERE temperature IS NOT NULL
+        """ + cutoff
+        ordersQuery = """
+            SELECT orders.studentID, orders.optionID, days.temperature, COUNT(*) AS count
+            FROM orders, days
+            WHERE orders.dayID = days.dayID
+            AND days.temperature IS NOT NULL
+        """ + cutoff + """
+            GROUP BY orders.studentID, orders.optionID, days.temperature
+        """
+        menusQuery = """
+            SELECT menu_options.optionID, days.temperature, COUNT(DISTINCT menu_options.dayID) AS count
+            FROM menu_options, days
+            WHERE menu_options.dayID = days.dayID
+            AND days.temperature IS NOT NULL
+        """ + cutoff + """
+            GROUP BY menu_options.optionID, days.temperature
+        """
+        days = db.executeQuery(daysQuery, params)
+        orderTallies = db.executeQuery(ordersQuery, params)
+        menuTallies = db.executeQuery(menusQuery, params)
+        return days, orderTallies, menuTallies
+
+    def addTallies(self, days, orderTallies, menuTallies):
+        """Adds the results of readTallies to the tallies"""
+        for day in days:
+            self.dayTemps[int(day['timestamp'])] = int(day['temperature'])
+        for tally in orderTallies:  # Tallying the orders also adds up the number of orders each student has placed
+            self.tallyOrder(int(tally['studentID']), int(tally['optionID']), int(tally['temperature']), int(tally['count']))
+        for tally in menuTallies:
+            self.tallyMenuOption(int(tally['optionID']), int(tally['temperature']), int(tally['count']))
+
+    def rebuild(self, db, beforeTS=None):
+        """Recalculates every tally from the history in the database, only using days before beforeTS unless it is None"""
+        with self.changing():
+            tallies = self.readTallies(db, None, beforeTS)  # Read while the snapshot is locked, so that no other process can record a change that these tallies then overwrite
+            self.clear()
+            self.beforeTS = beforeTS
+            self.addTallies(*tallies)
+            self.builtAt = time.time()
+            self.save()
+
+    def moveCutoff(self, db, beforeTS):
+        """Changes which days are in the history, for example when the day being predicted for moves on.
+        Moving the cutoff later only needs the days in between to be added, but anything else means the tallies are calculated again.
+        """
+        with self.changing():
+            if beforeTS == self.beforeTS:
+                return
+            if beforeTS is None or self.beforeTS is None or beforeTS < self.beforeTS:
+                self.rebuild(db, beforeTS)
+                return
+            self.addTallies(*self.readTallies(db, self.beforeTS, beforeTS))
+            self.beforeTS = beforeTS
+            self.save()
+
+    def orderAdded(self, studentID, optionID, dateTS):
+        """Updates the tallies after an order has been placed"""
+        with self.changing():
+            if self.isTracked(dateTS):  # Orders for days that are not in the history yet are counted when the temperature is recorded
+                self.tallyOrder(int(studentID), int(optionID), self.dayTemps[int(dateTS)], 1)
+                self.save()
+
+    def studentOrdersAdded(self, studentID, orders):
+        """Updates the tallies after a student has placed several orders at once, given as (optionID, dateTS) pairs"""
+        with self.changing():
+            changed = False
+            for optionID, dateTS in orders:
+                if self.isTracked(dateTS):
+                    self.tallyOrder(int(studentID), int(optionID), self.dayTemps[int(dateTS)], 1)
+                    changed = True
+            if changed:
+                self.save()     # The snapshot is only written once, however many orders were placed
+
+    def orderRemoved(self, studentID, optionID, dateTS):
+        """Updates the tallies after an order has been deleted"""
+        with self.changing():
+            if self.isTracked(dateTS):
+                self.tallyOrder(int(studentID), int(optionID), self.dayTemps[int(dateTS)], -1)
+                self.save()
+
+    def ordersRemoved(self, studentIDs, optionID, dateTS):
+        """Updates the tallies after several orders for the same option on the same day have been deleted, with one student ID for each order"""
+        with self.changing():
+            if self.isTracked(dateTS):
+                temp = self.dayTemps[int(dateTS)]
+                for studentID in studentIDs:
+                    self.tallyOrder(int(studentID), int(optionID), temp, -1)
+                self.save()     # The snapshot is only written once, however many orders were deleted
+
+    def menuOptionAdded(self, optionID, dateTS):
+        """Updates the tallies after an option has been added to the menu for a day"""
+        with self.changing():
+            if self.isTracked(dateTS):
+                self.tallyMenuOption(int(optionID), self.dayTemps[int(dateTS)], 1)
+                self.save()
+
+    def menuOptionRemoved(self, optionID, dateTS):
+        """Updates the tallies after an option has been removed from the menu for a day"""
+        with self.changing():
+            if self.isTracked(dateTS):
+                self.tallyMenuOption(int(optionID), self.dayTemps[int(dateTS)], -1)
+                self.save()
+
+    def optionOrdersRemoved(self, optionID):
+        """Updates the tallies after every order for an option has been deleted"""
+        optionID = int(optionID)
+        with self.changing():
+            for studentID in list(self.orderTallies.keys()):
+                for key, count in list(self.orderTallies[studentID].items()):
+                    if key[0] == optionID:
+                        self.tallyOrder(studentID, optionID, key[1], -count)
+            self.save()
+
+    def optionRemoved(self, optionID):
+        """Updates the tallies after an option has been deleted, along with its menus and orders"""
+        optionID = int(optionID)
+        with self.changing():
+            self.optionOrdersRemoved(optionID)
+            for key in list(self.menuTallies.keys()):
+                if key[0] == optionID:
+                    del self.menuTallies[key]
+            self.save()
+
+    def dayTemperatureSet(self, db, dateTS, temp):
+        """Moves the orders and menu for a day into the history, or to a new temperature if the day is already in the history"""
+        dateTS = int(dateTS)
+        temp = int(temp)
+
+        if not self.isInHistory(dateTS):    # Days on or after the cutoff are added when the cutoff moves past them
+            return
+
+        ordersQuery = """
+            SELECT orders.studentID, orders.optionID
+            FROM orders, days
+            WHERE orders.dayID = days.dayID
+            AND days.timestamp = %s
+        """
+        menuQuery = """
+            SELECT DISTINCT menu_options.optionID
+            FROM menu_options, days
+            WHERE menu_options.dayID = days.dayID
+            AND days.timestamp = %s
+        """
+        with self.changing():
+            orders = db.executeQuery(ordersQuery, (dateTS))
+            menuOptions = db.executeQuery(menuQuery, (dateTS))
+
+            oldTemp = self.dayTemps.get(dateTS)
+            for order in orders:
+                if oldTemp is not None:     # If the day was already in the history, we take it out of the tallies for the old temperature
+                    self.tallyOrder(int(order['studentID']), int(order['optionID']), oldTemp, -1)
+                self.tallyOrder(int(order['studentID']), int(order['optionID']), temp, 1)
+            for menuOption in menuOptions:
+                if oldTemp is not None:
+                    self.tallyMenuOption(int(menuOption['optionID']), oldTemp, -1)
+                self.tallyMenuOption(int(menuOption['optionID']), temp, 1)
+            self.dayTemps[dateTS] = temp
+            self.save()
+
+    def getFileStamp(self):
+        """Gets the inode and modification time of the snapshot file, or None if it doesn't exist. Every save replaces the file, so the inode changes even if two saves happen within the same clock tick"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime)
+
+    @contextmanager
+    def changing(self):
+        """Holds the lock on the snapshot while the tallies are changed, loading any changes that other processes have saved first.
+        Without this, two processes that both change the tallies would each save their own copy, and one change would be lost.
+        """
+        with self.lock:
+            if self.lockDepth == 0 and self.path is not None:
+                self.lockFile = open(self.path + ".lock", "a")
+                if fcntl is not None:
+                    fcntl.flock(self.lockFile, fcntl.LOCK_EX)   # Waits for any other process to finish saving its change
+                if self.getFileStamp() not in (None, self.fileStamp):  # Another process has saved the state since we last read it
+                    self.load()
+            self.lockDepth += 1
+            try:
+                yield
+            finally:
+                self.lockDepth -= 1
+                if self.lockDepth == 0 and self.lockFile is not None:
+                    self.lockFile.close()   # Closing the file releases the lock
+                    self.lockFile = None
+
+    def save(self):
+        """Writes the state to the snapshot file"""
+        with self.lock:
+            self.counter += 1   # Every change to the tallies is saved, so this is where the version changes
+            self.version = self.prefix + "-" + str(self.counter)
+            if self.path is None:   # A state without a snapshot file only lives in memory
+                return
+            snapshot = {
+                'version': self.version,
+                'beforeTS': self.beforeTS,
+                'builtAt': self.builtAt,
+                'days': [[dateTS, temp] for dateTS, temp in self.dayTemps.items()],
+                'studentOrders': [[studentID, count] for studentID, count in self.studentOrders.items()],
+                'orderTallies': [[studentID, key[0], key[1], count] for studentID, tallies in self.orderTallies.items() for key, count in tallies.items()],
+                'menuTallies': [[key[0], key[1], count] for key, count in self.menuTallies.items()],
+            }
+            tempPath = self.path + ".tmp"
+            with open(tempPath, "w") as snapshotFile:
+                json.dump(snapshot, snapshotFile)
+            os.rename(tempPath, self.path)  # Renaming is atomic, so a reader never sees a half written snapshot
+            self.fileStamp = self.getFileStamp()
+
+    def load(self):
+        """Reads the state from the snapshot file"""
+        with self.lock:
+            with open(self.path) as snapshotFile:
+                snapshot = json.load(snapshotFile)
+            self.clear()
+            self.version = snapshot.get('version')
+            if not isinstance(self.version, basestring):    # Snapshots from before versions had a prefix get a new version from this process
+                self.counter += 1
+                self.version = self.prefix + "-" + str(self.counter)
+            self.beforeTS = snapshot.get('beforeTS')
+            self.builtAt = snapshot.get('builtAt', 0)
+            for dateTS, temp in snapshot['days']:
+                self.dayTemps[dateTS] = temp
+            for studentID, count in snapshot['studentOrders']:
+                self.studentOrders[studentID] = count
+            for studentID, optionID, temp, count in snapshot['orderTallies']:
+                self.orderTallies.setdefault(studentID, {})[(optionID, temp)] = count
+            for optionID, temp, count in snapshot['menuTallies']:
+                self.menuTallies[(optionID, temp)] = count
+            self.fileStamp = self.getFileStamp()
+
+    def refresh(self, db, beforeTS=None):
+        """Makes sure the state matches the snapshot file and only has the days before beforeTS, creating the snapshot from the database if it doesn't exist yet"""
+        with self.lock:
+            if self.getFileStamp() is None:
+                self.rebuild(db, beforeTS)
+            elif self.getFileStamp() != self.fileStamp:     # Another process has saved the state since we last read it
+                self.load()
+            if time.time() - self.builtAt > RECONCILE_INTERVAL:
+                self.reconcile(db, beforeTS)
+            self.moveCutoff(db, beforeTS)
+
+    def reconcile(self, db, beforeTS=None):
+        """Calculates the tallies again from the database, unless another process has just done so"""
+        with self.changing():   # Loads the snapshot first, so that only one process recalculates the tallies each time
+            if time.time() - self.builtAt > RECONCILE_INTERVAL:
+                self.rebuild(db, beforeTS)
+
+
+
+states = {}     # One state for each snapshot file, shared by every request in this process
+statesLock = threading.Lock()
+
+def getModelState(path, db, beforeTS=None):
+    """Gets the model state that is saved in the given snapshot file, with only the days before beforeTS in its history"""
+    with statesLock:
+        if path not in states:
+            states[path] = ModelState(path)
+        state = states[path]
+    state.refresh(db, beforeTS)
+    return state
@@ -0,0 +1,259 @@
+# Created by third-parties
+from flask import request, session
+
+# Created by me
+import queries
+import referencecache
+import studentcache
+from pages.webpage import Webpage
+from pages.customer import markAllergens
+from versionstamps import versionStamps
+from tools import rejectNonCustomer, jsonResponse, notModified, withETag
+
+
+
+def apiError(message, status):
+    """Gets the response for a request that couldn't be carried out"""
+    return jsonResponse({"error": message}, status)
+
+
+
+def getRequestData():
+    """Gets the fields sent with a request, which can be a JSON object or an ordinary form"""
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        return data
+    return request.form
+
+
+
+class ApiEndpoint(Webpage):
+    """Base class for the customer API, which does the same things as the customer pages but sends JSON instead of HTML"""
+
+    def getWindow(self):
+        """Gets today's timestamp, along with the start and end of the two weeks that customers can order for"""
+        timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
+        tsToday = timestamp - (timestamp%self.SECONDS_IN_DAY)  # We don't want to include the time, we only want the day
+        startOfFirstWeek = self.getStartOfFirstWeek(tsToday)
+        endOfSecondWeek = startOfFirstWeek + 12*self.SECONDS_IN_DAY     # Includes the 1st second of the second Saturday, so we use < when comparing
+        return tsToday, startOfFirstWeek, endOfSecondWeek
+
+    def getHomeData(self, db):
+        """Gets the student's details and their orders for both weeks, from the same cache as the home page"""
+        tsToday, startOfFirstWeek, endOfSecondWeek = self.getWindow()
+        return studentcache.getStudentHome(db, session["userID"], startOfFirstWeek, endOfSecondWeek)
+
+    def isBookable(self, dateTS):
+        """Checks whether orders for a day can still be placed, changed or deleted"""
+        tsToday, startOfFirstWeek, endOfSecondWeek = self.getWindow()
+        return tsToday < dateTS < endOfSecondWeek
+
+    def checkChoice(self, db, optionID, dateTS):
+        """Gets the reason that the student can't order an option for a day, or None if they can"""
+        if not self.isBookable(dateTS):
+            return "Orders can't be placed or changed for this day"
+        menuData = [option for option in referencecache.getDayMenu(db, dateTS) if option['optionID'] == optionID]
+        if not menuData:
+            return "This option isn't on the menu for this day"
+        if menuData[0]['allergenMask'] & self.getHomeData(db)[0]['allergenMask']:
+            return "This option contains something you are allergic to"
+        return None
+
+
+
+class ApiWeek(ApiEndpoint):
+
+    @rejectNonCustomer     # Tells the client to log in if they are not logged in as a customer
+    def run(self):
+
+        tsToday, startOfFirstWeek, endOfSecondWeek = self.getWindow()
+
+        if request.args.get("week") == "1":     # The second week is sent if the client asks for it
+            startOfWeek = startOfFirstWeek + self.SECONDS_IN_DAY*7
+        else:
+            startOfWeek = startOfFirstWeek
+        endOfWeek = startOfWeek + 5*self.SECONDS_IN_DAY
+
+        # The ETag is made before anything is read, so it can only be older than the data it is sent with, never newer
+        etag = "week-" + str(session["userID"]) + "-" + studentcache.getStudentVersion(session["userID"]) + "-" + str(startOfWeek) + "-" + str(tsToday)
+        response = notModified(etag)
+        if response is not None:    # If the client already has this week, nothing needs to be read
+            return response
+
+        db = self.getDatabase()
+
+        homeData = self.getHomeData(db)
+        orders = dict((record['timestamp'], record) for record in homeData if record['orderID'] is not None)
+
+        days = []
+        for dateTS in range(startOfWeek, endOfWeek, self.SECONDS_IN_DAY):
+            day = {"date": dateTS}
+            if dateTS in orders:    # Days without an order only have their date, to keep the response small
+                day["order"] = orders[dateTS]['orderID']
+                day["option"] = orders[dateTS]['optionID']
+                day["name"] = orders[dateTS]['name']
+            days.append(day)
+
+        return withETag(jsonResponse({"balance": str(homeData[0]['balance']), "today": tsToday, "days": days}), etag)
+
+
+
+class ApiMenu(ApiEndpoint):
+
+    @rejectNonCustomer     # Tells the client to log in if they are not logged in as a customer
+    def run(self, dateTS):
+
+        etag = "menu-" + str(session["userID"]) + "-" + versionStamps.get("menu", dateTS)    # The allergens are different for each student, so so is the ETag
+        response = notModified(etag)
+        if response is not None:    # If the client already has this menu, nothing needs to be read
+            return response
+
+        db = self.getDatabase()
+
+        menuData = referencecache.getDayMenu(db, dateTS)
+        markAllergens(menuData, self.getHomeData(db)[0]['allergenMask'], referencecache.getAllergens(db))     # Finds which of the student's allergens each option contains
+
+        options = []
+        for option in menuData:
+            options.append({"id": option['optionID'], "name": option['name'], "price": str(option['price']), "allergens": option['allergens']})
+
+        return withETag(jsonResponse({"date": dateTS, "options": options}), etag)
+
+
+
+class ApiAddOrder(ApiEndpoint):
+
+    @rejectNonCustomer     # Tells the client to log in if they are not logged in as a customer
+    def run(self):
+
+        data = getRequestData()
+        try:
+            optionID = int(data["option"])
+            dateTS = int(data["date"])
+        except (KeyError, TypeError, ValueError):
+            return apiError("An option and a date must be given", 400)
+
+        db = self.getDatabase()
+
+        reason = self.checkChoice(db, optionID, dateTS)
+        if reason is not None:
+            return apiError(reason, 409)
+
+        db.beginTransaction()   # The payment and the order are saved together, or not at all
+
+        lockQueryParams = (session["userID"])
+        db.executeQuery(queries.lockStudent, lockQueryParams)    # Stops another request for the student placing an order until this one has been placed
+
+        orderedQueryParams = (session["userID"], dateTS, dateTS + self.SECONDS_IN_DAY)
+        if db.executeQuery(queries.studentOrderDays, orderedQueryParams):     # Checked in the transaction rather than from the cache, which other requests and processes may not have updated yet
+            db.rollback()
+            return apiError("You have already ordered for this day", 409)
+
+        studentQueryParams = (optionID, session["userID"], optionID, optionID, dateTS)
+        db.executeQuery(queries.payForOrder, studentQueryParams)
+
+        if db.rowCount == 0:    # If the student couldn't pay for the order
+            db.rollback()
+            checkExistsQueryParams = (optionID, dateTS)
+            if db.executeQuery(queries.optionOnMenu, checkExistsQueryParams):   # If the option is still on the menu, then the balance must have been too low
+                return apiError("Your balance is too low to order this", 409)
+            return apiError("The menu was changed before your order could be processed", 409)
+
+        orderQueryParams = (session["userID"], optionID, dateTS)
+        db.executeQuery(queries.addOrder, orderQueryParams)      # Adds the user's order to the database, finding the day in the same query
+        orderID = db.executeQuery(queries.lastInsertID)[0]['id']
+
+        db.commit()
+
+        self.getModelState(db).orderAdded(session["userID"], optionID, dateTS)    # Keeps the predictor's tallies up to date
+        studentcache.studentChanged(session["userID"])
+
+        return jsonResponse({"order": orderID, "option": optionID, "date": dateTS}, 201)
+
+
+
+class ApiOrder(ApiEndpoint):
+
+    @rejectNonCustomer     # Tells the client to log in if they are not logged in as a customer
+    def run(self, orderID):
+
+        if request.method == "DELETE":
+            return self.deleteOrder(orderID)
+        return self.changeOrder(orderID)
+
+    def changeOrder(self, orderID):
+        """Changes the order to a different option on the same day"""
+        data = getRequestData()
+        try:
+            optionID = int(data["option"])
+        except (KeyError, TypeError, ValueError):
+            return apiError("An option must be given", 400)
+
+        db = self.getDatabase()
+        db.beginTransaction()   # The change in balance and the change to the order are saved together, or not at all
+
+        orderQueryParams = (orderID, session["userID"])
+        orderData = db.executeQuery(queries.lockStudentOrder, orderQueryParams)     # Only the student's own orders can be changed
+
+        if not orderData:
+            db.rollback()
+            return apiError("This order doesn't exist", 404)
+        orderData = orderData[0]
+
+        if orderData['optionID'] == optionID:   # There is nothing to change
+            db.rollback()
+            return jsonResponse({"order": orderID, "option": optionID, "date": orderData['timestamp']})
+
+        reason = self.checkChoice(db, optionID, orderData['timestamp'])
+        if reason is not None:
+            db.rollback()
+            return apiError(reason, 409)
+
+        studentQueryParams = (orderID, optionID, session["userID"], optionID, orderID, orderID, session["userID"], optionID)
+        db.executeQuery(queries.payForChange, studentQueryParams)   # Updates the student's balance
+
+        if db.rowCount == 0:    # If the student couldn't pay the difference
+            db.rollback()
+            return apiError("Your balance is too low to change your order to this", 409)
+
+        changeQueryParams = (optionID, orderID)
+        db.executeQuery(queries.changeOrder, changeQueryParams)   # Swaps the order over to the new option
+
+        db.commit()
+
+        state = self.getModelState(db)      # Keeps the predictor's tallies up to date
+        state.orderRemoved(session["userID"], orderData['optionID'], orderData['timestamp'])
+        state.orderAdded(session["userID"], optionID, orderData['timestamp'])
+        studentcache.studentChanged(session["userID"])
+
+        return jsonResponse({"order": orderID, "option": optionID, "date": orderData['timestamp']})
+
+    def deleteOrder(self, orderID):
+        """Deletes the order and refunds the student"""
+        db = self.getDatabase()
+        db.beginTransaction()   # The refund and the deletion are saved together, or not at all
+
+        orderQueryParams = (orderID, session["userID"])
+        orderData = db.executeQuery(queries.lockStudentOrder, orderQueryParams)     # Locking the order stops it being refunded twice
+
+        if not orderData:   # If the order has already been deleted, or belongs to someone else
+            db.rollback()
+            return apiError("This order doesn't exist", 404)
+        orderData = orderData[0]
+
+        if not self.isBookable(orderData['timestamp']):
+            db.rollback()
+            return apiError("Orders can't be deleted for this day", 409)
+
+        studentQueryParams = (orderData['optionID'], session["userID"])
+        db.executeQuery(queries.refundOrder, studentQueryParams)
+
+        deleteQueryParams = (orderID)
+        db.executeQuery(queries.deleteOrder, deleteQueryParams)
+
+        db.commit()
+
+        self.getModelState(db).orderRemoved(session["userID"], orderData['optionID'], orderData['timestamp'])   # Keeps the predictor's tallies up to date
+        studentcache.studentChanged(session["userID"])
+
+        return "", 204     # There is nothing left to send back
@@ -6,9 +6,24 @@ import datetime
 from flask import render_template, request, redirect, url_for, session
 
 # Created by me
-from database import Database
+import queries
+import referencecache
+import studentcache
 from pages.webpage import Webpage
-from tools import redirectNonCustomer
+from tools import redirectNonCustomer, notModified, withETag
+
+
+
+def markAllergens(options, studentMask, allergens):
+    """Gives each option a list of the names of the student's allergens that it contains, which is empty if the option is safe for the student.
+    The masks of the option and the student only need to be ANDed together, and the names are only looked up if they clash.
+    """
+    for option in options:
+        clashes = option['allergenMask'] & studentMask
+        if clashes:
+            option['allergens'] = [allergen['name'] for allergen in allergens if clashes & (1 << allergen['maskBit'])]
+        else:
+            option['allergens'] = []
 
 
 
@@ -26,51 +41,126 @@ class CustomerHome(Webpage):
         if request.method == "POST" and "changeWeek" in request.form: # If the user wants to change which week they are viewing
             session["secondWeek"] = not session["secondWeek"]
 
+        dateToday = datetime.date.fromtimestamp(tsToday)
+
+        startOfFirstWeek = self.getStartOfFirstWeek(tsToday)    # Once we reach Saturday, the next week is displayed
+        endOfSecondWeek = startOfFirstWeek + 12*self.SECONDS_IN_DAY     # Includes the 1st second of the second Saturday, so we use < when comparing
+
         if session["secondWeek"]:   # If the user is currently viewing the second week
-            tsCurrent = tsToday + self.SECONDS_IN_DAY*7
+            startOfWeek = startOfFirstWeek + self.SECONDS_IN_DAY*7
         else:
-            tsCurrent = tsToday
+            startOfWeek = startOfFirstWeek
+        endOfWeek = startOfWeek + 5*self.SECONDS_IN_DAY
 
-        dateToday = datetime.date.fromtimestamp(tsToday)
-        dateCurrent = datetime.date.fromtimestamp(tsCurrent)
-
-        # Once we reach Saturday, the next week is displayed
-        tableDatesDict = {
-            'Sat':self.SECONDS_IN_DAY*2,
-            'Sun':self.SECONDS_IN_DAY,
-            'Mon':0,
-            'Tue':-self.SECONDS_IN_DAY,
-            'Wed':-self.SECONDS_IN_DAY*2,
-            'Thu':-self.SECONDS_IN_DAY*3,
-            'Fri':-self.SECONDS_IN_DAY*4,
-        } 
-
-        startOfWeek = tsCurrent + tableDatesDict[dateCurrent.strftime("%a")]
-        endOfWeek = startOfWeek + 5*self.SECONDS_IN_DAY    # Includes the 1st second of Saturday, so we use < when comparing
-
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
-
-        tableQuery = """
-            SELECT options.name, days.timestamp, orders.orderID
-            FROM orders, options, days
-            WHERE orders.optionID = options.optionID
-            AND orders.dayID = days.dayID
-            AND orders.studentID = %s
-            AND days.timestamp >= %s
-            AND days.timestamp < %s
-        """
-        tableQueryParams = (session["userID"], startOfWeek, endOfWeek)
-        tabledata = db.executeQuery(tableQuery, tableQueryParams)     # Executes the first SQL query
-        studentQuery = """
-            SELECT firstname, lastname, balance
-            FROM students
-            WHERE studentID = %s
-        """
-        studentQueryParams = (session["userID"])
-        studentdata = db.executeQuery(studentQuery, studentQueryParams)[0]  # Executes the second SQL query, and takes the only record
+        # The ETag changes whenever the student's orders or balance do, and is made before anything is read so that it can't be newer than the page
+        etag = "home-" + str(session["userID"]) + "-" + studentcache.getStudentVersion(session["userID"]) + "-" + str(startOfWeek) + "-" + str(tsToday)
+        response = notModified(etag)    # Only GET requests are answered with 304, since POST requests change which week is shown
+        if response is not None:    # If the browser already has this page, the database isn't needed and nothing is rendered
+            return response
+
+        db = self.getDatabase()
+
+        # Both weeks are read together in one query and cached, so switching between them doesn't need the database at all
+        homeData = studentcache.getStudentHome(db, session["userID"], startOfFirstWeek, endOfSecondWeek)
+        studentdata = homeData[0]   # Every record has the student's details
+        tabledata = [record for record in homeData if record['orderID'] is not None and startOfWeek <= record['timestamp'] < endOfWeek]
         # We also need to pass in the date class to have access to it in our template
-        return render_template("customer/customerHome.html", tabledata=tabledata, studentdata=studentdata, date=dateToday, tsToday=tsToday, start=startOfWeek,
+        page = render_template("customer/customerHome.html", tabledata=tabledata, studentdata=studentdata, date=dateToday, tsToday=tsToday, start=startOfWeek,
             dateclass=datetime.date, secondWeek=session["secondWeek"])
+        return withETag(page, etag)
+
+
+
+class BulkOrder(Webpage):
+
+    @redirectNonCustomer   # Redirects the user if they are not logged in as a customer
+    def run(self):
+
+        alert = None    # We may need to set an alert later
+
+        timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
+        tsToday = timestamp - (timestamp%self.SECONDS_IN_DAY)  # We don't want to include the time, we only want the day
+
+        startOfFirstWeek = self.getStartOfFirstWeek(tsToday)
+        endOfSecondWeek = startOfFirstWeek + 12*self.SECONDS_IN_DAY     # Includes the 1st second of the second Saturday, so we use < when comparing
+
+        # Every weekday in both weeks that hasn't already passed can be ordered for
+        bookableDays = []
+        for weekStart in (startOfFirstWeek, startOfFirstWeek + 7*self.SECONDS_IN_DAY):
+            for i in range(5):
+                dayTS = weekStart + i*self.SECONDS_IN_DAY
+                if dayTS > tsToday:
+                    bookableDays.append(dayTS)
+
+        db = self.getDatabase()
+
+        if "bulkConfirm" in request.form:   # If the user has submitted their choices
+            choices = []
+            for dayTS in bookableDays:
+                optionID = request.form.get("option" + str(dayTS), "")
+                if optionID:    # The user may leave some days without a meal
+                    choices.append((int(optionID), dayTS))
+
+            if not choices:
+                alert = "Please select an option for at least one day"
+            else:
+                db.beginTransaction()   # Every order and the payment for all of them are saved together, or not at all
+
+                studentQueryParams = (session["userID"])
+                studentData = db.executeQuery(queries.lockStudent, studentQueryParams)[0]   # Stops any other order for the student being paid for until these have been placed
+
+                menuQueryParams = (startOfFirstWeek, endOfSecondWeek)
+                menus = {}  # Maps each (optionID, timestamp) pair on the menu to the option's details
+                for record in db.executeQuery(queries.periodMenus, menuQueryParams):
+                    menus[(record['optionID'], record['timestamp'])] = record
+
+                orderedQueryParams = (session["userID"], startOfFirstWeek, endOfSecondWeek)
+                orderedDays = set(record['timestamp'] for record in db.executeQuery(queries.studentOrderDays, orderedQueryParams))
+
+                total = 0
+                choicesMask = 0     # Every allergen in any of the chosen options, so they can all be checked against the student's allergens at once
+                for choice in choices:
+                    if choice not in menus or choice[1] in orderedDays:
+                        alert = "The menu or your orders were changed before your orders could be processed"
+                        break
+                    total += menus[choice]['price']
+                    choicesMask |= menus[choice]['allergenMask']
+
+                if alert is None and choicesMask & studentData['allergenMask']:
+                    alert = "One of the options you selected contains something you are allergic to"
+
+                if alert is None:
+                    paymentQueryParams = (total, session["userID"], total)
+                    db.executeQuery(queries.payForOrders, paymentQueryParams)   # The balance is only updated once, for every order together
+
+                    if db.rowCount > 0:     # If the student could afford every order
+                        for optionID, dayTS in choices:
+                            orderQueryParams = (session["userID"], optionID, dayTS)
+                            db.executeQuery(queries.addOrder, orderQueryParams)
+
+                        db.commit()
+
+                        self.getModelState(db).studentOrdersAdded(session["userID"], choices)  # Keeps the predictor's tallies up to date
+                        studentcache.studentChanged(session["userID"])
+
+                        return redirect(url_for("customerHome"))
+
+                    alert = "Your balance is too low to place all of these orders."
+
+                db.rollback()
+
+        homeData = studentcache.getStudentHome(db, session["userID"], startOfFirstWeek, endOfSecondWeek)
+        studentdata = homeData[0]   # Every record has the student's details
+        orders = dict((record['timestamp'], record) for record in homeData if record['orderID'] is not None)
+        allergens = referencecache.getAllergens(db)
+
+        days = []
+        for dayTS in bookableDays:
+            menuData = referencecache.getDayMenu(db, dayTS)
+            markAllergens(menuData, studentdata['allergenMask'], allergens)     # Finds which of the student's allergens each option contains
+            days.append({'timestamp': dayTS, 'order': orders.get(dayTS), 'menu': menuData})
+
+        return render_template("customer/bulkOrder.html", days=days, studentdata=studentdata, dateclass=datetime.date, alert=alert)
 
 
 
@@ -81,45 +171,39 @@ class DeleteOrder(Webpage):
 
         if "orderConfirm" in request.form:     # If the user confirmed their choice in the POST request
             orderID = request.form["orderID"]
-            oldBalance = request.form["studentBalance"]
-            price = request.form["optionPrice"]
 
-            newBalance = float(oldBalance) + float(price)
+            db = self.getDatabase()
+            db.beginTransaction()   # The refund and the deletion are saved together, or not at all
+
+            orderQueryParams = (orderID, session["userID"])
+            orderData = db.executeQuery(queries.lockStudentOrder, orderQueryParams)     # We need to know what the order was for before it is deleted, and locking it stops it being refunded twice
+
+            if orderData:   # If the order hasn't already been deleted
+                orderData = orderData[0]
+
+                studentQueryParams = (orderData["optionID"], session["userID"])
+                db.executeQuery(queries.refundOrder, studentQueryParams)
+
+                deleteQueryParams = (orderID)
+                db.executeQuery(queries.deleteOrder, deleteQueryParams)
 
-            db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+                db.commit()
 
-            studentQuery = """
-                UPDATE students
-                SET balance = %s
-                WHERE studentID = %s
-            """
-            studentQueryParams = (newBalance, session["userID"])
-            db.executeQuery(studentQuery, studentQueryParams)
+                self.getModelState(db).orderRemoved(session["userID"], orderData["optionID"], orderData["timestamp"])   # Keeps the predictor's tallies up to date
+                studentcache.studentChanged(session["userID"])
 
-            deleteQuery = """
-                DELETE FROM orders
-                WHERE orderID = %s
-            """
-            deleteQueryParams = (orderID)
-            db.executeQuery(deleteQuery, deleteQueryParams)
+            else:
+                db.rollback()
 
             return redirect(url_for("customerHome"))
 
         if "orderID" in request.form:   # If the orderID was sent in the POST request
             orderID = request.form["orderID"]
 
-            db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+            db = self.getDatabase()
 
-            getInfoQuery = """
-                SELECT students.balance, options.price, options.name, days.timestamp
-                FROM students, options, orders, days
-                WHERE students.studentID = orders.studentID
-                AND options.optionID = orders.optionID 
-                AND days.dayID = orders.dayID
-                AND orders.orderID = %s
-            """
             getInfoQueryParams = (orderID)
-            data = db.executeQuery(getInfoQuery, getInfoQueryParams)[0]    # There will only be one record returned
+            data = db.executeQuery(queries.orderDetails, getInfoQueryParams)[0]    # There will only be one record returned
 
             return render_template("customer/deleteOrder.html", orderID=orderID, data=data, dateclass=datetime.date)
         # If the user somehow reached this page through a POST request without submitting the correct data
@@ -136,59 +220,35 @@ class AddOrder(Webpage):
 
         if "addConfirm" in request.form:  # If true, then the user has already selected the meal that they want to order
             optionID = request.form["optionID"]
-            oldBalance = request.form["studentBalance"]
             dateTS = request.form["dateFor"]
 
-            db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
-
-            checkExistsQuery = """
-                SELECT 1
-                FROM days, menu_options
-                WHERE days.dayID = menu_options.dayID
-                AND menu_options.optionID = %s
-                AND days.timestamp = %s
-            """
-            checkExistsQueryParams = (optionID, dateTS)
-            if db.executeQuery(checkExistsQuery, checkExistsQueryParams):   # If the option still exists in the menu for the relevant date
-
-                priceQuery = """
-                    SELECT price
-                    FROM options
-                    WHERE optionID = %s
-                """
-                priceQueryParams = (optionID)
-                price = db.executeQuery(priceQuery, priceQueryParams)[0]["price"]   # The 'price' field of the first and only record
-
-                newBalance = float(oldBalance) - float(price)
-
-                studentQuery = """
-                    UPDATE students
-                    SET balance = %s
-                    WHERE studentID = %s
-                """
-                studentQueryParams = (newBalance, session["userID"])
-                db.executeQuery(studentQuery, studentQueryParams)
-
-                dayQuery = """
-                    SELECT dayID
-                    FROM days
-                    WHERE timestamp = %s
-                """
-                dayQueryParams = (dateTS)
-                dayID = db.executeQuery(dayQuery, dayQueryParams)[0]["dayID"]
-
-                orderQuery = """
-                    INSERT INTO orders
-                    VALUES (default, %s, %s, %s)    
-                """
-                orderQueryParams = (session['userID'], optionID, dayID)
-                db.executeQuery(orderQuery, orderQueryParams)      # Adds the user's order to the database
+            db = self.getDatabase()
+            db.beginTransaction()   # The payment and the order are saved together, or not at all
+
+            studentQueryParams = (optionID, session["userID"], optionID, optionID, dateTS)
+            db.executeQuery(queries.payForOrder, studentQueryParams)
+
+            if db.rowCount > 0:     # If the student has paid for the order
+
+                orderQueryParams = (session['userID'], optionID, dateTS)
+                db.executeQuery(queries.addOrder, orderQueryParams)      # Adds the user's order to the database, finding the day in the same query
+
+                db.commit()
+
+                self.getModelState(db).orderAdded(session['userID'], optionID, dateTS)    # Keeps the predictor's tallies up to date
+                studentcache.studentChanged(session['userID'])
 
                 return redirect(url_for("customerHome"))
             
             else:
 
-                alert = "The menu was changed before your order could be processed"
+                db.rollback()
+
+                checkExistsQueryParams = (optionID, dateTS)
+                if db.executeQuery(queries.optionOnMenu, checkExistsQueryParams):   # If the option is still on the menu, then the balance must have been too low
+                    alert = "Your balance is too low to order this."
+                else:
+                    alert = "The menu was changed before your order could be processed"
 
 
         if "optionID" in request.form:  # If true, then the user has already selected the meal that they want to order
@@ -196,19 +256,13 @@ class AddOrder(Webpage):
             balance = request.form["studentBalance"]
             dateTS = int(request.form["dateFor"])
 
-            db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+            db = self.getDatabase()
 
-            optionQuery = """
-                SELECT name, price, optionID
-                FROM options
-                WHERE optionID = %s
-            """
-            optionQueryParams = (optionID)
-            optionData = db.executeQuery(optionQuery, optionQueryParams)[0]
+            optionData = referencecache.getOption(db, optionID)
 
             if float(optionData["price"]) < float(balance): # If the user can afford the option
 
-                return render_template("customer/addConfirm.html", optionData=optionData, balance=balance, dateclass=datetime.date, date=dateTS)
+                return render_template("customer/addConfirm.html", optionData=optionData, balance=balance, dateclass=datetime.date, date=dateTS, alert=alert)
 
             alert = "Your balance is too low to order this."
 
@@ -218,49 +272,17 @@ class AddOrder(Webpage):
         if "dateFor" in request.form:    # If the user hasn't chosen a meal option, or their meal option was not valid
             dateTS = int(request.form["dateFor"])
 
-            db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
-
-            optionsQuery = """
-                SELECT options.name, options.price, options.optionID
-                FROM days, menu_options, options
-                WHERE days.dayID = menu_options.dayID
-                AND options.optionID = menu_options.optionID
-                AND days.timestamp = %s
-                ORDER BY name
-            """
-            optionsQueryParams = (dateTS)
-            data = db.executeQuery(optionsQuery, optionsQueryParams)
-
-            balanceQuery = """
-                SELECT balance
-                FROM students
-                WHERE studentID = %s
-            """
+            db = self.getDatabase()
+
+            data = referencecache.getDayMenu(db, dateTS)
+
             balanceQueryParams = (session["userID"])
-            balance = db.executeQuery(balanceQuery, balanceQueryParams)[0]["balance"]
-
-            studentAllergensQuery = """
-                SELECT allergens.allergenID
-                FROM allergens, student_allergens
-                WHERE allergens.allergenID = student_allergens.allergenID
-                AND student_allergens.studentID = %s
-            """
-            studentAllergensQueryParams = (session["userID"])
-            studentAllergens = db.executeQuery(studentAllergensQuery, studentAllergensQueryParams)
-
-            optionAllergensQuery = """
-                SELECT allergens.allergenID, allergens.name, option_ingredients.optionID
-                FROM allergens, ingredient_allergens, option_ingredients, menu_options, days
-                WHERE allergens.allergenID = ingredient_allergens.allergenID
-                AND ingredient_allergens.ingredientID = option_ingredients.ingredientID
-                AND option_ingredients.optionID = menu_options.optionID
-                AND days.dayID = menu_options.dayID
-                AND days.timestamp = %s
-            """
-            optionAllergensQueryParams = (dateTS)
-            optionAllergens = db.executeQuery(optionAllergensQuery, optionAllergensQueryParams)
-
-            return render_template("customer/addOrder.html", dateFor=dateTS, balance=balance, data=data, dateclass=datetime.date, alert=alert, studentAllergens=studentAllergens, optionAllergens=optionAllergens)
+            studentData = db.executeQuery(queries.studentBalance, balanceQueryParams)[0]
+            balance = studentData["balance"]
+
+            markAllergens(data, studentData["allergenMask"], referencecache.getAllergens(db))     # Finds which of the student's allergens each option contains
+
+            return render_template("customer/addOrder.html", dateFor=dateTS, balance=balance, data=data, dateclass=datetime.date, alert=alert)
 
         # If the user somehow reached this page through a POST request without submitting the correct data
         return redirect(url_for("customerHome"))    
@@ -268,6 +290,21 @@ class AddOrder(Webpage):
 
 
 class ChangeOrder(Webpage):
+
+    def showMenu(self, db, dateTS, alert):
+        """Shows the options that the student's order for a day can be changed to"""
+        currentOrderQueryParams = (session["userID"], dateTS)
+        currentOrderData = db.executeQuery(queries.studentDayOrder, currentOrderQueryParams)[0]
+
+        menuData = [option for option in referencecache.getDayMenu(db, dateTS) if option['optionID'] != currentOrderData['optionID']]   # Every option on the menu except the one already ordered
+
+        balanceQueryParams = (session["userID"])
+        studentData = db.executeQuery(queries.studentBalance, balanceQueryParams)[0]
+        balance = studentData["balance"]
+
+        markAllergens(menuData, studentData["allergenMask"], referencecache.getAllergens(db))     # Finds which of the student's allergens each option contains
+
+        return render_template("customer/changeOrder.html", dateFor=dateTS, balance=balance, menuData=menuData, currentOrderData=currentOrderData, dateclass=datetime.date, alert=alert)
     
     @redirectNonCustomer   # Redirects the user if they are not logged in as a customer
     def run(self):
@@ -277,56 +314,45 @@ class ChangeOrder(Webpage):
         if "orderConfirm" in request.form:  # If true, then the user has confirmed that they want this choice
             currOrderID = request.form["currOrderID"]
             optionID = request.form["optionID"]
-            balance = float(request.form["studentBalance"])
-            priceDiff = float(request.form["priceDiff"])
-            dateTS = int(request.form["dateFor"])
 
-            db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
-
-            checkExistsQuery = """
-                SELECT 1
-                FROM days, menu_options
-                WHERE days.dayID = menu_options.dayID
-                AND menu_options.optionID = %s
-                AND days.timestamp = %s
-            """
-            checkExistsQueryParams = (optionID, dateTS)
-            if db.executeQuery(checkExistsQuery, checkExistsQueryParams):   # If the option still exists in the menu for the relevant date
-                
-                newBalance = balance + priceDiff
-
-                studentQuery = """
-                    UPDATE students
-                    SET balance = %s
-                    WHERE studentID = %s
-                """
-                studentQueryParams = (newBalance, session["userID"])
-                db.executeQuery(studentQuery, studentQueryParams)   # Updates the student's balance
-
-                deleteQuery = """
-                    DELETE FROM orders
-                    WHERE orderID = %s
-                """
-                deleteQueryParams = (currOrderID)
-                db.executeQuery(deleteQuery, deleteQueryParams)   # Deletes the old order
-
-                dayQuery = """
-                    SELECT dayID
-                    FROM days
-                    WHERE timestamp = %s
-                """
-                dayQueryParams = (dateTS)
-                dayID = db.executeQuery(dayQuery, dayQueryParams)[0]["dayID"]
-
-                orderQuery = """
-                    INSERT INTO orders
-                    VALUES (default, %s, %s, %s)
-                """
-                orderQueryParams = (session["userID"], optionID, dayID)
-                db.executeQuery(orderQuery, orderQueryParams)   # Creates the new order
+            db = self.getDatabase()
+            db.beginTransaction()   # The change in balance and the change to the order are saved together, or not at all
+
+            orderQueryParams = (currOrderID, session["userID"])
+            orderData = db.executeQuery(queries.lockStudentOrder, orderQueryParams)     # The order's own day is used rather than the one sent by the browser, and locking it stops it being changed twice
+
+            if not orderData:   # If the order has been deleted since the page was loaded
+                db.rollback()
+                return redirect(url_for("customerHome"))
+            orderData = orderData[0]
+
+            studentQueryParams = (currOrderID, optionID, session["userID"], optionID, currOrderID, currOrderID, session["userID"], optionID)
+            db.executeQuery(queries.payForChange, studentQueryParams)   # Updates the student's balance
+
+            if db.rowCount > 0:     # If the student has paid the difference
+
+                changeQueryParams = (optionID, currOrderID)
+                db.executeQuery(queries.changeOrder, changeQueryParams)   # Swaps the order over to the new option
+
+                db.commit()
+
+                studentcache.studentChanged(session["userID"])
+                state = self.getModelState(db)  # Keeps the predictor's tallies up to date
+                state.orderRemoved(session["userID"], orderData["optionID"], orderData["timestamp"])
+                state.orderAdded(session["userID"], optionID, orderData["timestamp"])
 
                 return redirect(url_for("customerHome"))
 
+            db.rollback()
+
+            checkExistsQueryParams = (optionID, orderData["timestamp"])
+            if db.executeQuery(queries.optionOnMenu, checkExistsQueryParams):   # If the option is on the order's menu, then the balance must have been too low
+                alert = "Your balance is too low to change your order to this."
+            else:
+                alert = "The menu was changed before your order could be processed"
+
+            return self.showMenu(db, orderData["timestamp"], alert)     # The confirmation form doesn't send the fields needed by the branches below
+
 
         if "optionID" in request.form:  # If true, then the user has already selected the meal that they want to order
             currOrderID = request.form["currentOrderID"]
@@ -334,28 +360,16 @@ class ChangeOrder(Webpage):
             balance = request.form["studentBalance"]
             dateTS = int(request.form["dateFor"])
 
-            db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
-
-            optionQuery = """
-                SELECT name, price, optionID
-                FROM options
-                WHERE optionID = %s
-            """
-            optionQueryParams = (optionID)
-            optionData = db.executeQuery(optionQuery, optionQueryParams)[0]
-
-            currentOrderQuery = """
-                SELECT options.name, options.price, orders.orderID
-                FROM options, orders
-                WHERE options.optionID = orders.optionID
-                AND orders.orderID = %s
-            """
+            db = self.getDatabase()
+
+            optionData = referencecache.getOption(db, optionID)
+
             currentOrderQueryParams = (currOrderID)
-            currOrderData = db.executeQuery(currentOrderQuery, currentOrderQueryParams)[0]
+            currOrderData = db.executeQuery(queries.orderOptionDetails, currentOrderQueryParams)[0]
 
             if float(optionData["price"]) - float(currOrderData["price"]) < float(balance): # If the user can afford the option
 
-                return render_template("customer/changeConfirm.html", optionData=optionData, currOrderData=currOrderData, balance=balance, dateclass=datetime.date, date=dateTS)
+                return render_template("customer/changeConfirm.html", optionData=optionData, currOrderData=currOrderData, balance=balance, dateclass=datetime.date, date=dateTS, alert=alert)
 
             alert = "Your balance is too low to change your order to this."
 
@@ -366,62 +380,9 @@ class ChangeOrder(Webpage):
             dateTS = int(request.form["dateFor"])
             print dateTS
 
-            db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
-
-            currentOrderQuery = """
-                SELECT options.name, options.optionID, orders.orderID
-                FROM orders, options, days
-                WHERE options.optionID = orders.optionID
-                AND days.dayID = orders.dayID
-                AND orders.studentID = %s
-                AND days.timestamp = %s
-            """
-            currentOrderQueryParams = (session["userID"], dateTS)
-            currentOrderData = db.executeQuery(currentOrderQuery, currentOrderQueryParams)[0]
-
-            menuQuery = """
-                SELECT options.name, options.price, options.optionID
-                FROM days, menu_options, options
-                WHERE days.dayID = menu_options.dayID
-                AND options.optionID = menu_options.optionID
-                AND days.timestamp = %s
-                AND options.optionID <> %s
-                ORDER BY name
-            """
-            menuQueryParams = (dateTS, currentOrderData['optionID'])
-            menuData = db.executeQuery(menuQuery, menuQueryParams)
-
-            balanceQuery = """
-                SELECT balance
-                FROM students
-                WHERE studentID = %s
-            """
-            balanceQueryParams = (session["userID"])
-            balance = db.executeQuery(balanceQuery, balanceQueryParams)[0]["balance"]
-
-            studentAllergensQuery = """
-                SELECT allergens.allergenID
-                FROM allergens, student_allergens
-                WHERE allergens.allergenID = student_allergens.allergenID
-                AND student_allergens.studentID = %s
-            """
-            studentAllergensQueryParams = (session["userID"])
-            studentAllergens = db.executeQuery(studentAllergensQuery, studentAllergensQueryParams)
-
-            optionAllergensQuery = """
-                SELECT allergens.allergenID, allergens.name, option_ingredients.optionID
-                FROM allergens, ingredient_allergens, option_ingredients, menu_options, days
-                WHERE allergens.allergenID = ingredient_allergens.allergenID
-                AND ingredient_allergens.ingredientID = option_ingredients.ingredientID
-                AND option_ingredients.optionID = menu_options.optionID
-                AND days.dayID = menu_options.dayID
-                AND days.timestamp = %s
-            """
-            optionAllergensQueryParams = (dateTS)
-            optionAllergens = db.executeQuery(optionAllergensQuery, optionAllergensQueryParams)
-
-
-            return render_template("customer/changeOrder.html", dateFor=dateTS, balance=balance, menuData=menuData, currentOrderData=currentOrderData, dateclass=datetime.date, alert=alert, studentAllergens=studentAllergens, optionAllergens=optionAllergens)
+            db = self.getDatabase()
+
+            return self.showMenu(db, dateTS, alert)
 
         # If the user somehow reached this page through a POST request without submitting the correct data
         return redirect(url_for("customerHome"))    
@@ -2,7 +2,6 @@
 from flask import render_template, request, redirect, url_for, session
 
 # Created by me
-from database import Database
 from pages.webpage import Webpage
 from tools import redirectLoggedIn
 
@@ -30,7 +29,7 @@ class Login(Webpage):
 
             if userID and password:     # If the user completed both fields of the form
 
-                db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)     # Create the database object
+                db = self.getDatabase()     # Create the database object
 
                 query = """
                     SELECT 1
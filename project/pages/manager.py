@@ -3,16 +3,29 @@ import time
 import datetime
 
 # Created by third-parties
-from flask import render_template, request, redirect, url_for, session
+from flask import render_template, request, redirect, url_for, session, Response
 
 # Created by me
-from database import Database
+import queries
+import referencecache
+import studentcache
 from predictor import Predictor
+from predictioncache import predictionCache
+from querystats import queryStats
 from pages.webpage import Webpage
 from tools import redirectNonManager
 
 
 
+def ingredientAllergensChanged(db, ingredientID):
+    """Works out the allergen mask of every option containing an ingredient again, after the ingredient's allergens change"""
+    db.executeQuery(queries.refreshIngredientAllergenMasks, ingredientID)
+    optionIDs = [option['optionID'] for option in db.executeQuery(queries.ingredientOptions, ingredientID)]
+    referencecache.optionsChanged(optionIDs)
+    referencecache.allergensChanged()
+
+
+
 class ManagerHome(Webpage):
     
     @redirectNonManager   # Redirects the user if they are not logged in as a manager
@@ -30,7 +43,7 @@ class ManageMenus(Webpage):
     @redirectNonManager   # Redirects the user if they are not logged in as a manager
     def run(self):
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
 
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
@@ -58,7 +71,7 @@ class ManageMenusEdit(Webpage):
     @redirectNonManager   # Redirects the user if they are not logged in as a manager
     def run(self):
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
         
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
@@ -68,58 +81,66 @@ class ManageMenusEdit(Webpage):
             dateFor = int(request.form['dateFor'])
             optionID = request.form['optionID']
 
-            # We first need to add back the balance to the students whose orders have been removed due to deleting the menu
-
-            queryParams = (optionID)
-            getStudentIDsQuery = """
-                SELECT students.studentID, students.balance
-                FROM students, orders
-                WHERE students.studentID = orders.studentID
-                AND orders.optionID = %s
-            """
-            getPriceQuery = """
-                SELECT price
-                FROM options
-                WHERE optionID = %s
-            """
-            studentData = db.executeQuery(getStudentIDsQuery, queryParams)  # Gets the data about each student who ordered this option
-            optionPrice = db.executeQuery(getPriceQuery, queryParams)[0]['price']   # Gets the price of the option
-
-            for student in studentData:     # For each student
-                newBalance = student['balance'] + optionPrice   # We calculate the new balance for the student
-                studentID = student['studentID']    # Get the student ID of the current student
-                updateQuery = """
-                    UPDATE students
-                    SET balance = %s
-                    WHERE studentID = %s
+            state = self.getModelState(db)
+            studentIDs = []
+            if state.isTracked(dateFor):    # We only need to know who ordered the option if the day is in the predictor's history
+                getStudentIDsQuery = """
+                    SELECT orders.studentID
+                    FROM orders, days
+                    WHERE days.dayID = orders.dayID
+                    AND orders.optionID = %s
+                    AND days.timestamp = %s
                 """
-                updateQueryParams = (newBalance, studentID)
-                db.executeQuery(updateQuery, updateQueryParams)     # We update each student record to have the correct balance
-
-            dayQuery = """
-                SELECT dayID
-                FROM days
-                WHERE timestamp = %s
+                getStudentIDsQueryParams = (optionID, dateFor)
+                studentIDs = [order['studentID'] for order in db.executeQuery(getStudentIDsQuery, getStudentIDsQueryParams)]
+
+            db.beginTransaction()   # The refunds and the deletions are saved together, or not at all
+
+            # We first need to add back the balance to the students whose orders for this day are being removed
+            # Every student is refunded by the same statement, however many students ordered the option
+            refundQuery = """
+                UPDATE students
+                SET balance = balance + (
+                    SELECT SUM(options.price)
+                    FROM orders, options, days
+                    WHERE options.optionID = orders.optionID
+                    AND days.dayID = orders.dayID
+                    AND orders.studentID = students.studentID
+                    AND orders.optionID = %s
+                    AND days.timestamp = %s)
+                WHERE studentID IN (
+                    SELECT orders.studentID
+                    FROM orders, days
+                    WHERE days.dayID = orders.dayID
+                    AND orders.optionID = %s
+                    AND days.timestamp = %s)
             """
-            dayQueryParams = (dateFor)
-            dayID = db.executeQuery(dayQuery, dayQueryParams)[0]["dayID"]
+            refundQueryParams = (optionID, dateFor, optionID, dateFor)
+            db.executeQuery(refundQuery, refundQueryParams)     # Refunds each student who ordered the option on this day
 
-            # Now we can delete the menu and any links it has to the options table
+            # Now we can delete the option from the menu and any orders for it on this day
 
             deleteQuery1 = """
                 DELETE FROM menu_options
                 WHERE optionID = %s
-                AND dayID = %s
+                AND dayID IN (SELECT dayID FROM days WHERE timestamp = %s)
             """
             deleteQuery2 = """
                 DELETE FROM orders
                 WHERE optionID = %s
+                AND dayID IN (SELECT dayID FROM days WHERE timestamp = %s)
             """
-            deleteQueryParams1 = (optionID, dayID)
-            deleteQueryParams2 = (optionID)
+            deleteQueryParams = (optionID, dateFor)
+
+            db.executeQuery(deleteQuery1, deleteQueryParams) # Delete the option from the menu options table
+            db.executeQuery(deleteQuery2, deleteQueryParams) # Delete any orders for the option on this day
+
+            db.commit()
 
-            db.executeQuery(deleteQuery1, deleteQueryParams1) # Delete the option from the menu options table
-            db.executeQuery(deleteQuery2, deleteQueryParams2) # Delete any orders containing the option
+            state.menuOptionRemoved(optionID, dateFor)  # Keeps the predictor's tallies up to date
+            state.ordersRemoved(studentIDs, optionID, dateFor)
+            referencecache.menuChanged(dateFor)
+            studentcache.studentsChanged()  # The students who ordered the option have been refunded
 
             return redirect(url_for("manageMenus")) # Redirect the user back to the manage menus page
 
@@ -127,13 +148,8 @@ class ManageMenusEdit(Webpage):
             dateFor = request.form['dateFor']   # Get the date that the menu is for
             optionID = request.form['optionID'] # Get the option ID of the option
 
-            getDayQuery = """
-                SELECT dayID
-                FROM days
-                WHERE timestamp = %s
-            """
             getDayQueryParams = (dateFor)
-            dayID = db.executeQuery(getDayQuery, getDayQueryParams)  # Get the day ID of the day that we want to add for
+            dayID = db.executeQuery(queries.dayIDByTimestamp, getDayQueryParams)  # Get the day ID of the day that we want to add for
 
             if len(dayID) == 0:    # We need to create the day if it doesn't exist yet
                 createDayQuery = """
@@ -142,7 +158,7 @@ class ManageMenusEdit(Webpage):
                 """
                 createDayQueryParams = (dateFor)
                 db.executeQuery(createDayQuery, createDayQueryParams)     # Create the day
-                dayID = db.executeQuery(getDayQuery, getDayQueryParams)  # Get the ID of the day
+                dayID = db.executeQuery(queries.dayIDByTimestamp, getDayQueryParams)  # Get the ID of the day
 
             dayID = dayID[0]['dayID']    # Get the actual ID from the list of records
 
@@ -153,6 +169,9 @@ class ManageMenusEdit(Webpage):
             addOptionQueryParams = (dayID, optionID)
             db.executeQuery(addOptionQuery, addOptionQueryParams)   # Adds the option to the menu for this day
 
+            self.getModelState(db).menuOptionAdded(optionID, dateFor)   # Keeps the predictor's tallies up to date
+            referencecache.menuChanged(dateFor)
+
             return redirect(url_for("manageMenus"))     # Redirect the user back to the manage menus page
 
         if "add" in request.form:   # If the user has chosen that they want add an option, but has not chosen a particular option yet
@@ -219,21 +238,10 @@ class ManageOptions(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
 
-        optionsQuery = """
-            SELECT *
-            FROM options
-            ORDER BY name
-        """
-        ingredientsQuery = """
-            SELECT ingredients.name, ingredients.pricePerKG, option_ingredients.optionID, option_ingredients.quantity
-            FROM ingredients, option_ingredients
-            WHERE ingredients.ingredientID = option_ingredients.ingredientID
-            ORDER BY name
-        """
-        optionsData = db.executeQuery(optionsQuery)     # Gets a list of all options
-        ingredientsData = db.executeQuery(ingredientsQuery)     # Gets a list of all ingredients that are used in an option
+        optionsData = referencecache.getAllOptions(db)     # Gets a list of all options
+        ingredientsData = referencecache.getOptionIngredientCosts(db)     # Gets a list of all ingredients that are used in an option
 
 
         optionCosts = {}    # Create an empty dictionary to store the cost of each option
@@ -254,20 +262,14 @@ class ManageOptionsEdit(Webpage):
 
         if "optionID" in request.form:  # If the user has chosen an option
 
-            db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+            db = self.getDatabase()
 
             timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
             dateToday = datetime.date.fromtimestamp(timestamp)
 
             optionID = request.form['optionID']  # Get the option ID of the option
 
-            optionQuery = """
-                SELECT name, price, optionID
-                FROM options
-                WHERE optionID = %s
-            """
-            optionQueryParams = (optionID)
-            optionData = db.executeQuery(optionQuery, optionQueryParams)[0]     # Get the details of the chosen option
+            optionData = referencecache.getOption(db, optionID)     # Get the details of the chosen option
 
             ingredientsQuery = """
                 SELECT ingredients.ingredientID, ingredients.name, ingredients.pricePerKG, option_ingredients.quantity
@@ -289,7 +291,7 @@ class ManageOptionsEditName(Webpage):
     @redirectNonManager   # Redirects the user if they are not logged in as a manager
     def run(self):
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
 
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
@@ -311,6 +313,8 @@ class ManageOptionsEditName(Webpage):
                 """
                 updateQueryParams = (newName, optionID)
                 db.executeQuery(updateQuery, updateQueryParams)     # Set the name of the option to the new name
+                referencecache.optionChanged(optionID)
+                studentcache.studentsChanged()  # The students' home pages show the names of the options they ordered
     
                 return redirect(url_for("manageOptions"))   # Redirect the user back to the manage options page
 
@@ -328,7 +332,7 @@ class ManageOptionsEditPrice(Webpage):
     @redirectNonManager   # Redirects the user if they are not logged in as a manager
     def run(self):
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
 
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
@@ -348,6 +352,7 @@ class ManageOptionsEditPrice(Webpage):
                 """
                 updateQueryParams = (newPrice, optionID)
                 db.executeQuery(updateQuery, updateQueryParams)     # Change the price to the new price
+                referencecache.optionChanged(optionID)
     
                 return redirect(url_for("manageOptions"))   # Redirect the user back to the manage options page
 
@@ -366,7 +371,7 @@ class ManageOptionsAddIngredient(Webpage):
     @redirectNonManager   # Redirects the user if they are not logged in as a manager
     def run(self):
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
         
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
@@ -383,12 +388,10 @@ class ManageOptionsAddIngredient(Webpage):
 
                 ingredientID = request.form['ingredientID']
 
-                query = """
-                    INSERT INTO option_ingredients
-                    VALUES (%s, %s, %s)
-                """
                 queryParams = (optionID, ingredientID, quantity)
-                db.executeQuery(query, queryParams)     # Add the ingredient to the option
+                db.executeQuery(queries.addOptionIngredient, queryParams)     # Add the ingredient to the option
+                db.executeQuery(queries.refreshOptionAllergenMask, optionID)    # The option now contains the ingredient's allergens too
+                referencecache.optionChanged(optionID)
 
                 return redirect(url_for("manageOptions"))
 
@@ -398,20 +401,10 @@ class ManageOptionsAddIngredient(Webpage):
 
             optionID = request.form['optionID']     # Get the option ID of the selected option
 
-            optionQuery = """
-                SELECT name
-                FROM options
-                WHERE optionID = %s
-            """
             optionQueryParams = (optionID)
-            optionName = db.executeQuery(optionQuery, optionQueryParams)    # Gets the name of the chosen option
+            optionName = db.executeQuery(queries.optionName, optionQueryParams)    # Gets the name of the chosen option
 
-            ingredientQuery = """
-                SELECT name, ingredientID, pricePerKG
-                FROM ingredients
-                ORDER BY name
-            """
-            ingredientData = db.executeQuery(ingredientQuery)   # Gets the list of all ingredients
+            ingredientData = referencecache.getAllIngredients(db)   # Gets the list of all ingredients
 
             return render_template("manager/manageOptionsAddIngredient.html", date=dateToday, optionID=optionID, optionName=optionName, data=ingredientData, alert=alert)
 
@@ -424,7 +417,7 @@ class ManageOptionsEditIngredient(Webpage):
     @redirectNonManager   # Redirects the user if they are not logged in as a manager
     def run(self):
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
         alert = None
 
         if "newQuantity" in request.form:   # If the user has selected a new quantity for the ingredient
@@ -444,6 +437,7 @@ class ManageOptionsEditIngredient(Webpage):
                 """
                 updateQueryParams = (newQuantity, optionID, ingredientID)
                 db.executeQuery(updateQuery, updateQueryParams)     # Change the quantity to the new quuantity
+                referencecache.optionChanged(optionID)
 
                 return redirect(url_for("manageOptions"))
 
@@ -458,13 +452,7 @@ class ManageOptionsEditIngredient(Webpage):
             timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
             dateToday = datetime.date.fromtimestamp(timestamp)
 
-            ingredientQuery = """
-                SELECT name, ingredientID
-                FROM ingredients
-                WHERE ingredientID = %s
-            """
-            ingredientQueryParams = (ingredientID)
-            ingredientData = db.executeQuery(ingredientQuery, ingredientQueryParams)[0]     # Gets the data about the selected ingredient
+            ingredientData = referencecache.getIngredient(db, ingredientID)     # Gets the data about the selected ingredient
 
             return render_template("manager/manageOptionsEditIngredient.html", date=dateToday, optionID=optionID, ingredientData=ingredientData, alert=alert)
 
@@ -477,7 +465,7 @@ class ManageOptionsDeleteIngredient(Webpage):
     @redirectNonManager   # Redirects the user if they are not logged in as a manager
     def run(self):
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
 
         if "deleteConfirm" in request.form:     # If the user has confirmed their choice to delete an ingredient
 
@@ -491,6 +479,8 @@ class ManageOptionsDeleteIngredient(Webpage):
             """
             deleteQueryParams = (optionID, ingredientID)
             db.executeQuery(deleteQuery, deleteQueryParams)     # Delete the option from the database
+            db.executeQuery(queries.refreshOptionAllergenMask, optionID)    # The option may no longer contain some allergens
+            referencecache.optionChanged(optionID)
 
             return redirect(url_for("manageOptions"))
 
@@ -502,21 +492,8 @@ class ManageOptionsDeleteIngredient(Webpage):
             timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
             dateToday = datetime.date.fromtimestamp(timestamp)
 
-            ingredientQuery = """
-                SELECT name, ingredientID
-                FROM ingredients
-                WHERE ingredientID = %s
-            """
-            ingredientQueryParams = (ingredientID)
-            ingredientData = db.executeQuery(ingredientQuery, ingredientQueryParams)[0] # Get the data about the selected ingredient
-
-            optionQuery = """
-                SELECT name
-                FROM options
-                WHERE optionID = %s
-            """
-            optionQueryParams = (optionID)
-            optionName = db.executeQuery(optionQuery, optionQueryParams)[0]['name'] # Get the name of the option that the ingredient is in
+            ingredientData = referencecache.getIngredient(db, ingredientID) # Get the data about the selected ingredient
+            optionName = referencecache.getOption(db, optionID)['name'] # Get the name of the option that the ingredient is in
 
             return render_template("manager/manageOptionsDeleteIngredient.html", date=dateToday, optionID=optionID, optionName=optionName, ingredientData=ingredientData)
 
@@ -541,14 +518,11 @@ class ManageOptionsAdd(Webpage):
 
             if name and price:
 
-                db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+                db = self.getDatabase()
 
-                newOptionQuery = """
-                    INSERT INTO options
-                    VALUES (default, %s, %s)
-                """
                 newOptionQueryParams = (name, price)
-                db.executeQuery(newOptionQuery, newOptionQueryParams)   # Create the new option
+                db.executeQuery(queries.addOption, newOptionQueryParams)   # Create the new option
+                referencecache.optionAdded()
                 return redirect(url_for("manageOptions"))
 
             else:
@@ -566,44 +540,35 @@ class ManageOptionsDelete(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
 
         if "deleteConfirm" in request.form:
 
             optionID = request.form['optionID']
 
-            # We need to ensure that each student record has the correct balance
-
-            getStudentIDsQuery = """
-                SELECT students.studentID, students.balance
-                FROM students, orders, days
-                WHERE students.studentID = orders.studentID
-                AND days.dayID = orders.dayID
-                AND orders.optionID = %s
-                AND days.timestamp >= %s
-            """
-            getStudentIDsQueryParams = (optionID, timestamp)
-
-            getPriceQuery = """
-                SELECT price
-                FROM options
-                WHERE optionID = %s
+            db.beginTransaction()   # The refunds and the deletions are saved together, or not at all
+
+            # We need to ensure that each student record has the correct balance, so every order from today onwards is refunded
+            # Every student is refunded by the same statement, however many students ordered the option
+            refundQuery = """
+                UPDATE students
+                SET balance = balance + (
+                    SELECT SUM(options.price)
+                    FROM orders, options, days
+                    WHERE options.optionID = orders.optionID
+                    AND days.dayID = orders.dayID
+                    AND orders.studentID = students.studentID
+                    AND orders.optionID = %s
+                    AND days.timestamp >= %s)
+                WHERE studentID IN (
+                    SELECT orders.studentID
+                    FROM orders, days
+                    WHERE days.dayID = orders.dayID
+                    AND orders.optionID = %s
+                    AND days.timestamp >= %s)
             """
-            getPriceQueryParams = (optionID)
-
-            studentData = db.executeQuery(getStudentIDsQuery, getStudentIDsQueryParams)  # Gets the data about the student who has ordered this option
-            optionPrice = db.executeQuery(getPriceQuery, getPriceQueryParams)[0]['price']   # Gets the price of the option
-
-            for student in studentData:
-                newBalance = student['balance'] + optionPrice   # We calculate the new balance for the student
-                studentID = student['studentID']    # Get the student ID
-                updateQuery = """
-                    UPDATE students
-                    SET balance = %s
-                    WHERE studentID = %s
-                """
-                updateQueryParams = (newBalance, studentID)
-                db.executeQuery(updateQuery, updateQueryParams)     # We update each student record to have the correct balance
+            refundQueryParams = (optionID, timestamp, optionID, timestamp)
+            db.executeQuery(refundQuery, refundQueryParams)     # Refunds each student who has ordered this option
 
             deleteQuery1 = """
                 DELETE FROM options
@@ -628,6 +593,12 @@ class ManageOptionsDelete(Webpage):
             db.executeQuery(deleteQuery3, deleteQueryParams)    # Delete the option from the orders table
             db.executeQuery(deleteQuery2, deleteQueryParams)    # Delete the option from the menu options table
             db.executeQuery(deleteQuery1, deleteQueryParams)    # Finally, delete the option from the options table
+
+            db.commit()
+
+            self.getModelState(db).optionRemoved(optionID)  # Keeps the predictor's tallies up to date
+            referencecache.optionChanged(optionID)
+            studentcache.studentsChanged()  # The students who ordered the option have been refunded
             
             return redirect(url_for("manageOptions"))   # Redirect the user to the manageOptions page
 
@@ -673,22 +644,10 @@ class ManageIngredients(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
-
-        ingredientsQuery = """
-            SELECT ingredientID, name, pricePerKG
-            FROM ingredients
-            ORDER BY name
-        """
-        ingredientsData = db.executeQuery(ingredientsQuery) # Gets the data for the ingredients
+        db = self.getDatabase()
 
-        allergensQuery = """
-            SELECT *
-            FROM allergens, ingredient_allergens
-            WHERE allergens.allergenID = ingredient_allergens.allergenID
-            ORDER BY allergens.name
-        """
-        allergensData = db.executeQuery(allergensQuery) # Gets the data for the allergens
+        ingredientsData = referencecache.getAllIngredients(db) # Gets the data for the ingredients
+        allergensData = referencecache.getIngredientAllergens(db) # Gets the data for the allergens
         
         return render_template("manager/manageIngredients.html", date=dateToday, ingredientsData=ingredientsData, allergensData=allergensData)
 
@@ -702,7 +661,7 @@ class ManageIngredientsAdd(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
         alert = None
 
         if request.method == "POST":    # If data has been sent in a POST request, then the user has sent the data about the ingredient
@@ -717,6 +676,7 @@ class ManageIngredientsAdd(Webpage):
                 """
                 insertQueryParams = (ingredientName, pricePerKG)
                 db.executeQuery(insertQuery, insertQueryParams)     # Insert the data into the database
+                referencecache.ingredientAdded()
 
                 return redirect(url_for('manageIngredients'))
 
@@ -734,7 +694,7 @@ class ManageIngredientsEdit(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
         
         if "newName" in request.form:   # If the user has chosen a new name for the ingredient
             newName = request.form['newName'] # Get the new name that the user has chosen
@@ -766,7 +726,7 @@ class ManageIngredientsEditName(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
         alert = None
         
         ingredientID = request.form['ingredientID']
@@ -783,6 +743,7 @@ class ManageIngredientsEditName(Webpage):
                 """
                 updateQueryParams = (newName, ingredientID)
                 db.executeQuery(updateQuery, updateQueryParams)     # Change the name to the new name
+                referencecache.ingredientChanged(ingredientID)
     
                 return redirect(url_for("manageIngredients"))   # Redirect the user to the manage ingredients page
 
@@ -803,7 +764,7 @@ class ManageIngredientsEditPPKG(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
         alert = None
 
         ingredientID = request.form['ingredientID']     # Get the ingredient ID of the selected ingredient
@@ -820,6 +781,7 @@ class ManageIngredientsEditPPKG(Webpage):
                 """
                 updateQueryParams = (newPPKG, ingredientID)
                 db.executeQuery(updateQuery, updateQueryParams)     # Update the price per kilogram to the new one
+                referencecache.ingredientChanged(ingredientID)
     
                 return redirect(url_for("manageIngredients"))   # Redirect to the manage ingredients page
 
@@ -842,7 +804,7 @@ class ManageIngredientsDeleteAllergen(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
 
         # Get the data from the POST request
         allergenID = request.form['allergenID']
@@ -857,6 +819,7 @@ class ManageIngredientsDeleteAllergen(Webpage):
             """
             deleteQueryParams = (ingredientID, allergenID)
             db.executeQuery(deleteQuery, deleteQueryParams)     # Delete the allergen from the database
+            ingredientAllergensChanged(db, ingredientID)
 
             return redirect(url_for("manageIngredients")) # Redirect the user to the manage ingredients page
 
@@ -877,7 +840,7 @@ class ManageIngredientsAddAllergen(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
         alert = None
 
         ingredientID = request.form['ingredientID']     # Get the ingredient ID for the selected ingredient   
@@ -895,6 +858,7 @@ class ManageIngredientsAddAllergen(Webpage):
                 """
                 insertQueryParams = (ingredientID, allergenID)
                 db.executeQuery(insertQuery, insertQueryParams)     # Add the allergen to the database
+                ingredientAllergensChanged(db, ingredientID)
     
                 return redirect(url_for("manageIngredients"))   # Redirect the user to the manage ingredients page
 
@@ -925,7 +889,7 @@ class ManageIngredientsDelete(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
 
         # Get the data from the POST request        
         ingredientID = request.form['ingredientID']
@@ -948,9 +912,11 @@ class ManageIngredientsDelete(Webpage):
             """
 
             db.executeQuery(deleteQuery3, deleteQueryParams)    # Delete the ingredient from the ingredient allergens table
+            ingredientAllergensChanged(db, ingredientID)   # This must happen before the ingredient is taken out of the options, so that we know which options it was in
             db.executeQuery(deleteQuery2, deleteQueryParams)    # Delete the ingredient from the option ingredients table
             db.executeQuery(deleteQuery1, deleteQueryParams)    # Finally, delete the ingredient from the ingredients table
             # The record containing the primary key must be deleted last
+            referencecache.ingredientChanged(ingredientID)
 
             return redirect(url_for('manageIngredients'))   # Redirect the user to the manage ingredients page
 
@@ -975,7 +941,7 @@ class ViewReports(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
 
         if "reportType" not in session:     # If no session variable exists called report type
             session["reportType"] = "option"    # Initialise it by setting it to option
@@ -1030,7 +996,7 @@ class ViewReportsOptions(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
 
         if 'dateFor' in request.form:   # If we have a date to view the order reports for
             dateFor = int(request.form['dateFor'])
@@ -1082,15 +1048,10 @@ class OptionCreator(Webpage):
         timestamp = self.TODAY      # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
         alert = None
 
-        ingredientsQuery = """
-            SELECT *
-            FROM ingredients
-            ORDER BY name
-        """
-        ingredientsData = db.executeQuery(ingredientsQuery)     # Gets the list of all ingredients
+        ingredientsData = referencecache.getAllIngredients(db)     # Gets the list of all ingredients
         
         if request.method == "POST":    # If the user has submitted their choices for the quantities of meals
 
@@ -1105,12 +1066,8 @@ class OptionCreator(Webpage):
 
                 if price and name:
     
-                    addOptionQuery = """
-                        INSERT INTO options
-                        VALUES (default, %s, %s)
-                    """
                     addOptionQueryParams = (name, price)
-                    db.executeQuery(addOptionQuery, addOptionQueryParams, close=False)  # Add the option to the database
+                    db.executeQuery(queries.addOption, addOptionQueryParams, close=False)  # Add the option to the database
     
                     getIDQuery = "SELECT LAST_INSERT_ID() AS id"
                     optionID = db.executeQuery(getIDQuery)[0]['id']     # Get the primary key of the last record inserted
@@ -1123,13 +1080,11 @@ class OptionCreator(Webpage):
                             else:
                                 quantity = 0
     
-                            addIngredientQuery = """
-                                INSERT INTO option_ingredients
-                                VALUES (%s, %s, %s)
-                            """
                             addIngredientQueryParams = (optionID, ingredientID, quantity)
-                            db.executeQuery(addIngredientQuery, addIngredientQueryParams)   # Adds the ingredient to the option
+                            db.executeQuery(queries.addOptionIngredient, addIngredientQueryParams)   # Adds the ingredient to the option
     
+                    db.executeQuery(queries.refreshOptionAllergenMask, optionID)    # Works out the allergens of the new option
+                    referencecache.optionAdded()
                     return redirect(url_for("optionCreator"))   # Redirects the user to the option creator page
 
                 elif not name:
@@ -1172,7 +1127,7 @@ class AddWeatherData(Webpage):
         timestamp = self.TODAY     # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
         alert = None
 
         if request.method == "POST":    # If the user submitted the new weather data in the POST request
@@ -1182,13 +1137,8 @@ class AddWeatherData(Webpage):
 
             if temp != "":
 
-                checkExistsQuery = """
-                    SELECT COUNT(*) AS count
-                    FROM days
-                    WHERE timestamp = %s
-                """
                 checkExistsQueryParams = (dateTS)
-                if db.executeQuery(checkExistsQuery, checkExistsQueryParams) == 0:      # If the day doesn't exist yet
+                if len(db.executeQuery(queries.dayIDByTimestamp, checkExistsQueryParams)) == 0:      # If the day doesn't exist yet
 
                     insertQuery = """
                         INSERT INTO days
@@ -1207,6 +1157,8 @@ class AddWeatherData(Webpage):
                     updateQueryParams = (temp, dateTS)
                     db.executeQuery(updateQuery, updateQueryParams)
 
+                self.getModelState(db).dayTemperatureSet(db, dateTS, temp)    # The day's orders and menu now become part of the predictor's history
+
                 return redirect(url_for("managerHome"))     # redirect the user to the manager home page
 
             alert = "The field is required"
@@ -1248,7 +1200,40 @@ class AddWeatherData(Webpage):
 
 
 
+def getPredictionState(page, db):
+    """Gets the model state that the prediction pages use, or None if the tallies are grouped by the database for each prediction instead.
+    Sweeps and comparisons always use tallies, so the engines that read every order use the grouped tallies for them
+    """
+    if page.PREDICTION_ENGINE != "state":
+        return None
+    return page.getModelState(db)
+
+
+
+def predictMenu(page, db, pd):
+    """Predicts the orders for the predictor's menu and temperature, using the engine chosen by the page's PREDICTION_ENGINE"""
+    if page.PREDICTION_ENGINE == "aggregated":
+        pd.setDB(db)
+        return pd.predictAggregated()
+    if page.PREDICTION_ENGINE == "history":
+        pd.setDB(db)
+        if page.PREDICTION_WORKERS != 1:    # Large schools can share the scoring between several processes
+            pd.enableParallel(page.PREDICTION_WORKERS, page.PARALLEL_THRESHOLD)
+        return pd.predict()
+    if page.PREDICTION_ENGINE == "vector":
+        from vectorpredictor import VectorPredictor     # Only imported when it is chosen, so NumPy isn't needed otherwise
+        vpd = VectorPredictor(pd.todayTS, pd.predictionTemp, pd.predictionMenu)
+        vpd.setDB(db)
+        return vpd.predict()
+    return predictionCache.predict(pd, page.getModelState(db))     # Predict the orders from the tallies, unless the same prediction has already been made
+
+
+
 class PredictOrders(Webpage):
+
+    SWEEP_FROM = -5     # The default range of temperatures shown by a temperature sweep, in degrees Celsius
+    SWEEP_TO = 35
+    MAX_SWEEP = 60      # The widest range a sweep can cover, since every degree in it is a separate prediction
     
     @redirectNonManager   # Redirects the user if they are not logged in as a manager
     def run(self):
@@ -1256,14 +1241,48 @@ class PredictOrders(Webpage):
         timestamp = self.TODAY     # For development purposes, we are using an artificial timestamp that does not change
         dateToday = datetime.date.fromtimestamp(timestamp)
 
-        db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)
+        db = self.getDatabase()
         alert = None
 
         if request.method == "POST":    # If the user has submitted the data to predict for
 
             options = request.form.getlist("optionID")
 
-            if request.form['temp'] != "" and len(options) > 0:
+            if "sweep" in request.form and len(options) > 0:   # If the user wants to see how demand changes with the temperature
+
+                try:
+                    sweepFrom = int(request.form.get('sweepFrom') or self.SWEEP_FROM)
+                    sweepTo = int(request.form.get('sweepTo') or self.SWEEP_TO)
+                except ValueError:
+                    sweepFrom, sweepTo = None, None
+
+                if sweepFrom is None:
+                    alert = "The lowest and highest temperatures must be whole numbers"
+
+                elif sweepFrom > sweepTo:
+                    alert = "The lowest temperature must not be above the highest temperature"
+
+                elif sweepTo - sweepFrom > self.MAX_SWEEP:
+                    alert = "A sweep can cover at most " + str(self.MAX_SWEEP) + " degrees"
+
+                else:
+
+                    optionsFormatted = [int(i) for i in options]    # We need to turn the contents of options into integers.
+                    temps = range(sweepFrom, sweepTo + 1)   # One row for each whole degree in the range
+
+                    pd = Predictor(timestamp, None, optionsFormatted)
+                    pd.setDB(db)
+                    sweep = pd.predictSweep(temps, getPredictionState(self, db))
+
+                    optionsData = [option for option in referencecache.getOptionNames(db) if option['optionID'] in optionsFormatted]     # The options on the menu, in alphabetical order
+
+                    sweepData = []
+                    for temp in temps:  # For each temperature, we show the estimated quantity of every option on the menu
+                        sweepData.append({'temp':temp, 'quantities':[int(round(sweep[temp][option['optionID']])) for option in optionsData]})
+
+                    return render_template("manager/predictOrdersSweep.html", date=dateToday, optionsData=optionsData, sweepData=sweepData)
+
+            elif request.form['temp'] != "" and len(options) > 0:
 
                 temp = int(request.form['temp'])    # Get the temperature on the date to predict for
 
@@ -1271,14 +1290,9 @@ class PredictOrders(Webpage):
                 optionsFormatted = [int(i) for i in options]    # We need to turn the contents of options into integers.
 
                 pd = Predictor(timestamp, temp, optionsFormatted)
-                pd.connectDB(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME)  # Connect the predictor to the database
-                orders = pd.predict()   # Predict the orders
+                orders = predictMenu(self, db, pd)
 
-                optionsQuery = """
-                    SELECT name, optionID
-                    FROM options
-                """
-                optionsData = db.executeQuery(optionsQuery)     # Get a list of all options
+                optionsData = referencecache.getOptionNames(db)     # Get a list of all options
 
                 menuData = []
                 for option in optionsData:  # For each option that is available
@@ -1288,13 +1302,110 @@ class PredictOrders(Webpage):
 
                 return render_template("manager/predictOrdersDisplay.html", date=dateToday, menuData=menuData)
 
-            alert = "All fields are required"
+            else:
+                alert = "All fields are required"
 
-        optionsQuery = """
-            SELECT *
-            FROM options
-            ORDER BY name
-        """
-        optionsData = db.executeQuery(optionsQuery)     # Gets a list of all options
+        optionsData = referencecache.getAllOptions(db)     # Gets a list of all options
+
+        return render_template("manager/predictOrders.html", date=dateToday, optionsData=optionsData, alert=alert, sweepFrom=self.SWEEP_FROM, sweepTo=self.SWEEP_TO)
+
+
+
+class PredictOrdersCompare(Webpage):
+
+    MAX_SCENARIOS = 30  # The most candidate menus that can be compared at once. predictMany shares the tallies between them, but each menu still adds a form section and a column of quantities
+
+    @redirectNonManager   # Redirects the user if they are not logged in as a manager
+    def run(self):
+
+        timestamp = self.TODAY     # For development purposes, we are using an artificial timestamp that does not change
+        dateToday = datetime.date.fromtimestamp(timestamp)
+
+        db = self.getDatabase()
+        alert = None
+
+        optionsData = referencecache.getOptionNames(db)     # Gets a list of all options
+
+        numScenarios = 3    # The number of candidate menus shown when the page is first opened
+        scenarios = []
+        if request.method == "POST":    # If the user has submitted candidate menus
+            try:
+                numScenarios = int(request.form.get('numScenarios', ""))
+            except ValueError:
+                numScenarios = 3
+            numScenarios = max(1, min(numScenarios, self.MAX_SCENARIOS))   # A changed form can't make us read or predict any more menus than this
+
+            for i in range(numScenarios):   # Each candidate menu has its own temperature field and set of option checkboxes
+                temp = request.form.get('temp' + str(i), "")
+                options = [int(optionID) for optionID in request.form.getlist('optionID' + str(i)) if optionID.isdigit()]
+                scenarios.append({'temp':temp, 'options':options})
+
+            if "addScenario" in request.form:   # If the user wants another candidate menu to compare
+                if numScenarios < self.MAX_SCENARIOS:
+                    numScenarios += 1
+                    scenarios.append({'temp':"", 'options':[]})
+                else:
+                    alert = "At most " + str(self.MAX_SCENARIOS) + " menus can be compared at once"
+
+            else:
+                chosen = [scenario for scenario in scenarios if scenario['temp'] != "" and len(scenario['options']) > 0]   # Incomplete candidate menus are ignored
+
+                try:
+                    for scenario in chosen:
+                        scenario['temp'] = int(scenario['temp'])
+                except ValueError:  # If a temperature isn't a whole number, the page is shown again instead of predicting anything
+                    alert = "Each temperature must be a whole number"
+                    chosen = []
+
+                if len(chosen) > 0:
+
+                    pd = Predictor(timestamp, None, None)
+                    pd.setDB(db)
+                    results = pd.predictMany([(scenario['options'], int(scenario['temp'])) for scenario in chosen], getPredictionState(self, db))     # Predicts every candidate menu in one pass
+
+                    menuData = []
+                    for option in optionsData:  # For each option, we show the predicted quantity under every candidate menu that includes it
+                        quantities = []
+                        for orders in results:
+                            if option['optionID'] in orders:
+                                quantities.append(int(round(orders[option['optionID']])))
+                            else:
+                                quantities.append(None)     # The option isn't on this candidate menu
+                        if quantities.count(None) < len(quantities):
+                            menuData.append({'name':option['name'], 'quantities':quantities})
+
+                    temps = [int(scenario['temp']) for scenario in chosen]
+
+                    return render_template("manager/predictOrdersCompareDisplay.html", date=dateToday, menuData=menuData, temps=temps)
+
+                if alert is None:
+                    alert = "At least one menu needs a temperature and an option"
+
+        while len(scenarios) < numScenarios:
+            scenarios.append({'temp':"", 'options':[]})
+
+        return render_template("manager/predictOrdersCompare.html", date=dateToday, optionsData=optionsData, scenarios=scenarios, numScenarios=numScenarios, alert=alert)
+
+
+
+class Diagnostics(Webpage):
+
+    @redirectNonManager   # Redirects the user if they are not logged in as a manager
+    def run(self):
+
+        timestamp = self.TODAY     # For development purposes, we are using an artificial timestamp that does not change
+        dateToday = datetime.date.fromtimestamp(timestamp)
+
+        if request.method == "POST" and "reset" in request.form:    # If the user wants to start measuring again from now
+            queryStats.clear()
+            return redirect(url_for("diagnostics"))
+
+        if request.args.get('format') == "json":    # The statistics can also be downloaded, so that they can be compared between days
+            return Response(queryStats.dumpJSON(), mimetype="application/json")
+
+        aggregates = queryStats.getAggregates()    # The queries that took the most time in total come first
+        slowQueries = queryStats.getSlowQueries()
+        since = datetime.datetime.fromtimestamp(queryStats.since)
 
-        return render_template("manager/predictOrders.html", date=dateToday, optionsData=optionsData, alert=alert)
+        return render_template("manager/diagnostics.html", date=dateToday, aggregates=aggregates, slowQueries=slowQueries, since=since,
+            slowThreshold=queryStats.slowThreshold, datetimeclass=datetime.datetime)
@@ -1,3 +1,14 @@
+# Part of the Python Standard Library
+import os
+import datetime
+
+# Created by third-parties
+from flask import g
+
+# Created by me
+from database import Database
+from modelstate import getModelState
+
 class Webpage():
 
     def __init__(self):
@@ -6,8 +17,51 @@ class Webpage():
         self.PASSWORD = "raspberry"
         self.DBNAME = "cafeteria"
 
+        self.MODEL_STATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modelstate.json")  # Snapshot of the tallies used by the predictor
+
+        # How the manager's prediction pages predict orders:
+        #   "state"         From the tallies in the model state snapshot, which pages keep up to date as orders change
+        #   "aggregated"    From tallies that the database groups for each prediction, without keeping a snapshot
+        #   "history"       From every order in the history, using Predictor.predict
+        #   "vector"        From every order in the history, using VectorPredictor, which needs NumPy
+        self.PREDICTION_ENGINE = "state"
+        self.PREDICTION_WORKERS = 1     # With the "history" engine, students are scored on this many processes, or one per CPU core if it is None
+        self.PARALLEL_THRESHOLD = 1000  # The fewest students worth sharing between processes
+
         self.SECONDS_IN_DAY = 86400
         self.TODAY = 1578528000     # We are using an artificial timestamp for development purposes
 
+    def getDatabase(self):
+        """Gets the database object for this request, which keeps one connection open for every query until the request has finished"""
+        if 'db' not in g:   # The connection is only borrowed from the pool once the page actually needs it
+            g.db = Database(self.HOSTNAME, self.USER, self.PASSWORD, self.DBNAME, keepOpen=True, source=self.__class__.__name__)
+        return g.db
+
+    def getStartOfFirstWeek(self, tsToday):
+        """Gets the timestamp of the Monday of the first week that customers can see, which is the next week once we reach Saturday"""
+        dateToday = datetime.date.fromtimestamp(tsToday)
+        tableDatesDict = {
+            'Sat':self.SECONDS_IN_DAY*2,
+            'Sun':self.SECONDS_IN_DAY,
+            'Mon':0,
+            'Tue':-self.SECONDS_IN_DAY,
+            'Wed':-self.SECONDS_IN_DAY*2,
+            'Thu':-self.SECONDS_IN_DAY*3,
+            'Fri':-self.SECONDS_IN_DAY*4,
+        }
+        return tsToday + tableDatesDict[dateToday.strftime("%a")]
+
+    def getModelState(self, db):
+        """Gets the predictor's model state, so that pages which change orders, menus or weather can keep it up to date"""
+        return getModelState(self.MODEL_STATE_PATH, db, self.TODAY)    # Like Predictor.predict, only the days before today are part of the history
+
     def run(self):
         pass
+
+
+
+def closeRequestDatabase(exception=None):
+    """Returns the request's database connection to the pool once the request has finished"""
+    db = g.pop('db', None)
+    if db is not None:
+        db.closeConn()
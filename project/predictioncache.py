@@ -0,0 +1,61 @@
+# Part of the Python Standard Library
+import threading
+from collections import OrderedDict
+
+
+
+class PredictionCache():
+    """Remembers the most recent predictions, so that repeating a prediction doesn't run the predictor again.
+    Each prediction is stored with the version of the model state it was made from, so a cached prediction is never used once the data has changed.
+    """
+
+    def __init__(self, maxSize=128):
+        """Constructor method for the PredictionCache class"""
+        self.maxSize = maxSize  # The most predictions that will be remembered at once
+        self.entries = OrderedDict()    # Ordered from least to most recently used
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def makeKey(self, menu, temp, version):
+        """Creates the key for a prediction. The order of the options in the menu doesn't change the prediction, so they are sorted"""
+        return (tuple(sorted(set(menu))), temp, version)
+
+    def lookup(self, menu, temp, version):
+        """Gets a copy of the cached quantities for a prediction, or None if it hasn't been cached"""
+        key = self.makeKey(menu, temp, version)
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            quantities = self.entries.pop(key)
+            self.entries[key] = quantities  # Moves the prediction to the most recently used end
+            self.hits += 1
+            return dict(quantities)
+
+    def store(self, menu, temp, version, quantities):
+        """Adds the quantities for a prediction to the cache, removing the least recently used prediction if the cache is full"""
+        key = self.makeKey(menu, temp, version)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = dict(quantities)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+
+    def predict(self, predictor, state):
+        """Gets the predictor's quantities from the cache, or predicts them from the model state and caches them"""
+        version = state.version     # Read before predicting, so a change during the prediction can't be cached under the newer version
+        quantities = self.lookup(predictor.predictionMenu, predictor.predictionTemp, version)
+        if quantities is None:
+            quantities = predictor.predictFromState(state)
+            self.store(predictor.predictionMenu, predictor.predictionTemp, version, quantities)
+        return quantities
+
+    def clear(self):
+        """Removes every prediction from the cache"""
+        with self.lock:
+            self.entries.clear()
+
+
+
+predictionCache = PredictionCache()     # Shared by every request in this process
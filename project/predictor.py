@@ -1,10 +1,13 @@
 # Part of the Python Standard Library
 import math
 import time
+import multiprocessing
+from array import array
 
 # Created by me
 from database import Database
-from tools import dictMergeSort, findUpperLower
+from modelstate import ModelState
+from tools import groupDicts
 
 class Predictor():
     def __init__(self, timestamp, temp, menu):
@@ -14,10 +17,25 @@ class Predictor():
         self.predictionMenu = menu      # Menu for the date to predict
         self.students = []
         self.menus = []
+        self.workers = 1    # Students are scored in the request's own process unless parallel scoring is enabled
+        self.parallelThreshold = 0
 
-    def connectDB(self, host, user, pw, dbname):
+    def enableParallel(self, workers=None, threshold=1000):
+        """Scores the students on a pool of worker processes when there are at least threshold students.
+        By default, there is one worker for each CPU core.
+        """
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.workers = workers
+        self.parallelThreshold = threshold
+
+    def connectDB(self, host, user, pw, dbname, backend="mysql"):
         """Creates a database object"""
-        self.db = Database(host, user, pw, dbname)
+        self.db = Database(host, user, pw, dbname, source=self.__class__.__name__, backend=backend)
+
+    def setDB(self, db):
+        """Uses an existing database object, such as the one for the current request, instead of connecting again"""
+        self.db = db
 
     def getStudents(self):
         """Gets a list containing the IDs of all students in the database"""
@@ -37,17 +55,18 @@ class Predictor():
         data = self.db.executeQuery(query)  # Executes the database query
         return data
 
-    def getOrders(self):
-        """Gets a list containing all historic order records from the database"""
+    def iterOrders(self):
+        """Gets an iterator over all historic order records in the database, with each record as a (student ID, option ID, timestamp, temperature) tuple.
+        The records are streamed from the database, so the whole order history is never held in memory at once
+        """
         query = """
-            SELECT * 
+            SELECT orders.studentID, orders.optionID, days.timestamp, days.temperature
             FROM orders, days
             WHERE orders.dayID = days.dayID
             AND days.timestamp < %s
         """
         params = (self.todayTS)
-        data = self.db.executeQuery(query, params)  # Executes the database query
-        return data
+        return self.db.iterQuery(query, params, tuples=True)     # Executes the database query
 
     def getDays(self):
         """Gets a list containing all historic menu records from the database"""
@@ -70,65 +89,77 @@ class Predictor():
         return data
 
     def createStudentObjects(self, students, orders):
-        """Creates a student object for each student given"""
-        ordersSorted = dictMergeSort(orders, "studentID")
-        orderIndices = findUpperLower(ordersSorted, "studentID")
+        """Creates a student object for each student given, from an iterable of order tuples like the ones from iterOrders"""
+        orderOptions = {}   # Maps each student ID to an array of the option IDs that they have ordered
+        orderDates = {}     # Maps each student ID to an array of the dates of their orders
+        for studentID, optionID, dateFor, temp in orders:   # Each order is added straight to the arrays, so we never need a list of every order record
+            if studentID not in orderOptions:
+                orderOptions[studentID] = array('l')
+                orderDates[studentID] = array('l')
+            orderOptions[studentID].append(optionID)
+            orderDates[studentID].append(dateFor)
+
         for student in students:    # For each student record
             studentID = student['studentID']
-            studentIndices = orderIndices[studentID]
-            studentOrders = ordersSorted[studentIndices[0] : studentIndices[1]]
-            studentObj = Student(studentID, studentOrders)  # Create a student object
+            if studentID in orderOptions:
+                studentObj = Student(studentID, orderOptions[studentID], orderDates[studentID])  # Create a student object
+            else:   # A student who has never ordered anything has no arrays yet
+                studentObj = Student(studentID, array('l'), array('l'))
             self.students.append(studentObj)    # Add the student object to our list of students
 
 
     def createMenuObjects(self, days, menuOptions):
         """Creates an object for each menu that exists"""
+        menuOptionsGrouped = groupDicts(menuOptions, "dayID")   # Maps each day ID to a list of the options on that day's menu
         for day in days:  # For each menu record
             dayID = day['dayID']
             dateFor = day['timestamp']
-            options = []    # Create an empty list of options
-            for option in menuOptions:  # For each menu option record
-                if option['dayID'] == dayID:  # If the menu ID of the menu and menu option records match
-                    options.append(option['optionID'])  # Then add it to our list of options
+            options = [option['optionID'] for option in menuOptionsGrouped.get(dayID, [])]  # Get the list of options for that menu
             menuObj = Menu(dayID, dateFor, options)    # Create a menu object
             self.menus.append(menuObj)  # Add the menu object to our list of menus
 
     def setStudentOptions(self, options):
-        """Creates the option objects for each student"""
+        """Gives each student the list of option IDs"""
+        optionIDs = [optionDict['optionID'] for optionDict in options]
         for student in self.students:   # For each student in our list of students
-            student.createOptionObjects(options)    # Create an option object for out student.
+            student.setOptions(optionIDs)    # Every student shares the same list, rather than having an object for every option
 
-    def calcOptionPriorities(self, menu):
+    def createAvailabilityIndex(self, menus):
+        """Creates a dictionary mapping each option ID to the summed importance of the menus that it was available in"""
+        availability = {}
+        for menu in menus:  # For each menu that the students could have ordered from
+            for optionID in set(menu.getOptions()):     # An option only counts once per menu, even if it is listed twice
+                availability[optionID] = availability.get(optionID, 0) + menu.getImportance()
+        return availability
+
+    def calcOptionPriorities(self, menus):
         """Calculates the option priorities of each student in our students list"""
+        availability = self.createAvailabilityIndex(menus)  # This only depends on the option, so every student shares it
         for student in self.students:   # For each student in our list of students
-            student.calcOptionPriority(menu)    # Calculate that student's option priorities
+            student.calcOptionPriority(availability)    # Calculate that student's option priorities
 
-    def calcOrderLikelihoods(self, menu):
+    def calcOrderLikelihoods(self, menus):
         """Calculates the likelihood of each student in our students list ordering a meal"""
         for student in self.students:   # For each studentin our list of students
-            student.calcOrderLikelihood(menu)   # Calculate the probability of that student placing an order
+            student.calcOrderLikelihood(len(menus))   # Calculate the probability of that student placing an order
 
     def setWeather(self, days):
         """Sets the temperature value for each menu and order"""
-        daysSorted = dictMergeSort(days, "timestamp")
-        dayIndices = findUpperLower(daysSorted, "timestamp")
         daysDict = {}
-
-        for key, value in dayIndices.iteritems():
-            daysDict[key] = daysSorted[value[0]]['temperature']
+        for day in days:    # Maps the timestamp of each day to the temperature on that day
+            if day['timestamp'] not in daysDict:    # The first record for each day is used, like when the days were sorted
+                daysDict[day['timestamp']] = day['temperature']
 
         for menu in self.menus:     # For each menu in our list of menus
             menu.setTemp(daysDict[menu.getDateFor()])   # Set the temperature of that menu to the temperature of that day
 
         for student in self.students:   # For each student in our list of students
-            for order in student.getOrders():    # For each order in the list of that student's orders
-                order.setTemp(daysDict[order.getDateFor()])  # Set the temperature of that order to the temperature of that day
+            student.setOrderTemps(daysDict)     # Set the temperature of each of that student's orders to the temperature of that day
 
     def setImportances(self):
         """Sets the importances of each menu and each order that a student has placed based on the weather"""
         for student in self.students:   # for each student in our list of students
-            for order in student.getOrders():    # For each order in that student's list of orders
-                order.setImportance(self.predictionTemp)    # Calculate the importance of that order
+            student.setOrderImportances(self.predictionTemp)    # Calculate the importance of each of that student's orders
         for menu in self.menus:     # For each menu in our list of menus
             menu.setImportance(self.predictionTemp)     # Calculate the importance of the options in that menu
 
@@ -147,23 +178,147 @@ class Predictor():
 
         return quantities   # Return the final quantities of each ingredient
 
+    def calcTempImportance(self, temp, predictionTemp):
+        """Calculates the importance of a temperature using the same bell curve as the Order and Menu classes"""
+        difference = temp - predictionTemp
+        exponent = -float(difference**2)/30     # The natural logarithm of the height of the bell curve at the given temperature value
+        return math.exp(exponent)
+
+    def calcStatePriorities(self, state, predictionTemp):
+        """Calculates each student's priority for each option they have ordered from the tallies in a model state"""
+        importances = {}
+        for temp in set(state.dayTemps.values()):   # The bell curve only needs evaluating once for each temperature in the history
+            importances[temp] = self.calcTempImportance(temp, predictionTemp)
+
+        availability = {}   # The summed importance of the menus that each option was available in
+        for key, count in state.menuTallies.items():
+            availability[key[0]] = availability.get(key[0], 0) + count*importances[key[1]]
+
+        priorities = {}
+        for studentID, tallies in state.orderTallies.items():
+            orderCounts = {}
+            for key, count in tallies.items():
+                orderCounts[key[0]] = orderCounts.get(key[0], 0) + count*importances[key[1]]
+
+            priorities[studentID] = {}
+            for optionID, orderCount in orderCounts.items():
+                if availability.get(optionID, 0) > 0:  # If the option was never available in any menu, then it has the lowest priority
+                    priorities[studentID][optionID] = float(orderCount)/float(availability[optionID])
+
+        return priorities
+
+    def calcStateQuantities(self, state, priorities, menu):
+        """Calculates the expected quantities of each option on a menu from the student priorities for a model state"""
+        menuOptions = set(menu)
+        numMenus = state.getNumMenus()
+
+        quantities = {}     # Create an empty quantities dictionary
+        for optionID in menu:
+            quantities[optionID] = 0    # Initialises our quantities dictionary
+
+        for studentID, studentPriorities in priorities.items():    # Students who have never ordered are expected to order nothing
+
+            if numMenus > 0:
+                orderLikelihood = float(state.studentOrders[studentID])/float(numMenus)
+            else:
+                orderLikelihood = 0.5
+
+            totalPriorityShortlisted = 0
+            for optionID, priority in studentPriorities.items():
+                if optionID in menuOptions:
+                    totalPriorityShortlisted += priority
+
+            if totalPriorityShortlisted == 0:   # If the student has not ordered anything on the menu before, then assume that they like everything equally
+                for optionID in menuOptions:
+                    quantities[optionID] += orderLikelihood/len(menuOptions)
+            else:
+                priorityScalar = orderLikelihood/totalPriorityShortlisted
+                for optionID, priority in studentPriorities.items():
+                    if optionID in menuOptions:
+                        quantities[optionID] += priorityScalar * priority
+
+        return quantities
+
+    def predictFromState(self, state):
+        """Calculates the expected quantities of each option on the menu from the tallies in a model state, instead of the full order history"""
+        priorities = self.calcStatePriorities(state, self.predictionTemp)
+        return self.calcStateQuantities(state, priorities, self.predictionMenu)
+
+    def loadAggregatedState(self):
+        """Gets a model state with tallies that the database has grouped by student, option and temperature, using the same days as predict"""
+        state = ModelState(None)    # The tallies are only needed for this prediction, so they are not saved
+        state.rebuild(self.db, self.todayTS)
+        return state
+
+    def predictAggregated(self):
+        """Begins execution of the prediction algorithm using tallies that the database has grouped by student, option and temperature, instead of every order record"""
+        return self.predictFromState(self.loadAggregatedState())
+
+    def predictMany(self, scenarios, state=None):
+        """Calculates the expected quantities for each (menu, temperature) pair in scenarios, returning a list with one quantities dictionary per pair.
+        The history is only loaded once, and the student priorities are only calculated once for each distinct temperature.
+        """
+        if state is None:   # Without a saved model state, we tally the history from the database once for all of the scenarios
+            state = self.loadAggregatedState()
+
+        priorities = {}
+        for menu, temp in scenarios:
+            if temp not in priorities:
+                priorities[temp] = self.calcStatePriorities(state, temp)
+
+        return [self.calcStateQuantities(state, priorities[temp], menu) for menu, temp in scenarios]
+
+    def predictSweep(self, temps, state=None):
+        """Calculates the expected quantities of each option on the menu at each of the given temperatures, returning a dictionary mapping each temperature to its quantities.
+        The history is grouped by temperature, so the bell curve is only evaluated once for each pair of history temperature and target temperature.
+        """
+        results = self.predictMany([(self.predictionMenu, temp) for temp in temps], state)
+        return dict(zip(temps, results))
+
+    def calcExpectedQuantitiesParallel(self):
+        """Calculates the expected quantities of each option by splitting the students into chunks and scoring each chunk on a worker process"""
+        availability = self.createAvailabilityIndex(self.menus)     # Every chunk shares the same availability index
+        chunkSize = int(math.ceil(float(len(self.students))/self.workers))
+        chunks = []
+        for i in range(0, len(self.students), chunkSize):
+            chunks.append((self.students[i : i+chunkSize], availability, len(self.menus), self.predictionMenu))
+
+        pool = multiprocessing.Pool(self.workers)
+        try:
+            chunkQuantities = pool.map(scoreStudentChunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+
+        quantities = {}     # Create an empty quantities dictionary
+        for optionID in self.predictionMenu:
+            quantities[optionID] = 0    # Initialises our quantities dictionary
+        for chunk in chunkQuantities:   # The total quantity of each option is the sum of the quantities from every chunk
+            for optionID, quantity in chunk.items():
+                quantities[optionID] += quantity
+
+        return quantities
+
     def predict(self):
         """Begins execution of the prediction algorithm"""
 
         # We start by getting all of the data we need from the database
         studentsRaw = self.getStudents()
-        ordersRaw = self.getOrders()
         optionsRaw = self.getOptions()
         daysRaw = self.getDays()
         menuOptionsRaw = self.getMenuOptions()
 
         # We create the student objects and menu objects
-        self.createStudentObjects(studentsRaw, ordersRaw)
+        self.createStudentObjects(studentsRaw, self.iterOrders())   # The orders are read from the database as the student objects are created
         self.setStudentOptions(optionsRaw)
         self.createMenuObjects(daysRaw, menuOptionsRaw)
 
         self.setWeather(daysRaw)     # We set the weather for each order and menu to the weather on the date it was for
         self.setImportances()   # We set all of the importance values for each order and menu
+
+        if self.workers > 1 and len(self.students) >= self.parallelThreshold:   # Large schools can share the scoring between several processes
+            return self.calcExpectedQuantitiesParallel()
+
         self.calcOptionPriorities(self.menus)   # We calculate the option priorities for each student
         self.calcOrderLikelihoods(self.menus)   # We calculate the likelihood of each student placing an order
         return self.calcExpectedQuantities()    # Finally, we calculate the expected quantities of each option on the menu
@@ -171,65 +326,94 @@ class Predictor():
 
 
 
-class Student():
-    def __init__(self, studentID, orders):
-        """Constructor method for the Student class"""
+def scoreStudentChunk(chunk):
+    """Scores a chunk of students on a worker process, returning the expected quantity of each option for those students"""
+    students, availability, numMenus, menu = chunk
+
+    quantities = {}
+    for optionID in menu:
+        quantities[optionID] = 0
+
+    for student in students:
+        student.calcOptionPriority(availability)
+        student.calcOrderLikelihood(numMenus)
+        for option in student.calcExpectedOrders(menu):
+            quantities[option.getID()] += option.getPriorityScaled()
+
+    return quantities
+
+
+
+class Student(object):
+    # Students don't need an attribute dictionary, which saves memory when there are thousands of them
+    __slots__ = ('id', 'orderOptions', 'orderDates', 'orderTemps', 'orderImportances', 'optionIDs', 'priorities', 'orderLikelihood')
+
+    def __init__(self, studentID, orderOptions, orderDates):
+        """Constructor method for the Student class.
+        The option ID and date of each order that the student has placed are stored in compact arrays, with one entry per order, instead of an object per order
+        """
         self.id = studentID
-        self.createOrderObjects(orders)     # Creates an order object for each order that the student has placed
-
-    def createOrderObjects(self, orders):
-        """Gives each student an order object for each order they have placed"""
-        self.orders = []    # An empty list of orders
-        for orderDict in orders:    # For each order that the student has placed
-            orderObj = Order(orderDict['orderID'], orderDict['optionID'], orderDict['timestamp'])     # Create an order object
-            self.orders.append(orderObj)    # Add that order object to our list of orders
-
-    def createOptionObjects(self, options):
-        """Gives each student an option object for each option"""
-        self.options = []   # An empty list of options
-        for optionDict in options:  # For each option in the database
-            optionObj = Option(optionDict['optionID'])      # Create an option object
-            self.options.append(optionObj)  # Add that option object to our list of options
+        self.orderOptions = orderOptions
+        self.orderDates = orderDates
+
+    def setOrderTemps(self, daysDict):
+        """Sets the temperature of each order to the temperature on the date that it is for"""
+        self.orderTemps = array('l', [daysDict[dateFor] for dateFor in self.orderDates])
+
+    def setOrderImportances(self, temp):
+        """Calculates the importance of each order by mapping its temperature to the height of a bell curve.
+        The x-coordinate of the bell curve is the temperature and the y-value of the bell curve is the importance.
+        The centre of the bell curve is the predicted temerature
+        The importance fits in the range 0 < importance <= 1
+        """
+        importances = {}    # Orders on days with the same temperature have the same importance, so we only calculate it once
+        for orderTemp in set(self.orderTemps):
+            difference = orderTemp - temp
+            exponent = -float(difference**2)/30     # The natural logarithm of the height of the bell curve at the given temperature value
+            importances[orderTemp] = math.exp(exponent)     # The importance is the height of the bell curve at the given temperature value
+        self.orderImportances = array('d', [importances[orderTemp] for orderTemp in self.orderTemps])
+
+    def setOptions(self, optionIDs):
+        """Sets the list of the option IDs of every option"""
+        self.optionIDs = optionIDs
         
-    def calcOrderLikelihood(self, menus):
-        """Calculates the likelihood of this student ordering something on any given day"""
-        numOrders = len(self.orders) # The total number of orders placed by the student
-        numMenus = len(menus)   # The total number of menus that the student could have ordered from
+    def calcOrderLikelihood(self, numMenus):
+        """Calculates the likelihood of this student ordering something on any given day, given the total number of menus that the student could have ordered from"""
+        numOrders = len(self.orderOptions) # The total number of orders placed by the student
         if numMenus > 0:    # If we have more than zero menus, then a divide by zero error will not occur
             self.orderLikelihood = float(numOrders)/float(numMenus)     # The order likelihood is the probability of the student ordering on any given day
         else:   # If no historic order records or menu records are available, assume the student orders 50% of the time
             self.orderLikelihood = 0.5
 
-    def calcOptionPriority(self, menus):
-        """Calculates how the student prioritises each option"""
-        for option in self.options:     # For each option
+    def calcOptionPriority(self, availability):
+        """Calculates how the student prioritises each option, given the summed importance of the menus each option was available in.
+        Only the options that the student has ordered are stored, since every other option has the lowest priority
+        """
+        orderCounts = {}
+        for optionID, importance in zip(self.orderOptions, self.orderImportances):   # For each order that the student has placed
+            orderCounts[optionID] = orderCounts.get(optionID, 0) + importance   # Add the importance of that order to the order count (0 < importance <= 1)
 
-            optionID = option.getID()    # Initialise some variables
-            orderCount = 0
-            availableCount = 0
-            
-            for order in self.orders:   # For each option that the student has placed
-                if order.getOption() == optionID:    # If it is an order for the option we are currently looking at
-                    orderCount += order.getImportance()  # Add the importance of that order to the order count (0 < importance <= 1)
+        self.priorities = {}
+        for optionID, orderCount in orderCounts.items():     # For each option that the student has ordered
 
-            for menu in menus:  # For each menu that the student could have ordered from
-                if optionID in menu.getOptions():    # If the option we are looking at is in the menu
-                    availableCount += menu.getImportance()
+            availableCount = availability.get(optionID, 0)
 
             if availableCount > 0:  # If the option was available more than zero times, then a divide by zero error will not occur
-                priority = float(orderCount)/float(availableCount)  # The option priority is the probability of the option being ordered given that it was on the menu
-            else:
-                priority = 0.0  # If the option was never available in any menu, then assume that it has the lowest priority
+                self.priorities[optionID] = float(orderCount)/float(availableCount)  # The option priority is the probability of the option being ordered given that it was on the menu
 
-            option.setPriority(priority)
+    def getPriority(self, optionID):
+        """Gets the priority of an option, which is 0 for options that the student has never ordered"""
+        return self.priorities.get(optionID, 0.0)
 
     def calcExpectedOrders(self, menu):
         """Calculates the likelihood of the student ordering each item from the menu"""
         menuOptions = []    # Create an empty list of menu options
         totalPriorityShortlisted = 0    # Initialise our total priority shortlisted
 
-        for option in self.options: # For each option that is available
-            if option.getID() in menu:   # If the option is in the menu
+        for optionID in self.optionIDs: # For each option that is available
+            if optionID in menu:   # If the option is in the menu
+                option = Option(optionID)   # Option objects are only created for the options on the menu
+                option.setPriority(self.getPriority(optionID))
                 menuOptions.append(option)  # Add it to our list of menu options
                 totalPriorityShortlisted += option.getPriority()     # Add the priority of our option to our total priority shortlisted
 
@@ -248,49 +432,15 @@ class Student():
 
         return menuOptions
 
-    def getOrders(self):
-        """Gets the list of orders that the student has placed"""
-        return self.orders
-
-
-
-class Order():
-    def __init__(self, orderID, optionID, dateFor):
-        """Constructor method for the Order class"""
-        self.id = orderID
-        self.option = optionID
-        self.dateFor = dateFor
-
-    def setTemp(self, temp):
-        """Sets temp to the temperature on the date that the menu is for"""
-        self.temp = temp
+    def getNumOrders(self):
+        """Gets the number of orders that the student has placed"""
+        return len(self.orderOptions)
 
-    def setImportance(self, temp):  
-        """Calculates the importance of the order by mapping the temperature to the height of a bell curve.
-        The x-coordinate of the bell curve is the temperature and the y-value of the bell curve is the importance.
-        The centre of the bell curve is the predicted temerature
-        The importance fits in the range 0 < importance <= 1
-        """
-        difference = self.temp - temp
-        exponent = -float(difference**2)/30     # The natural logarithm of the height of the bell curve at the given temperature value
-        importance = math.exp(exponent)     # The immportance is the height of the bell curve at the given temperature value
-        self.importance = importance
 
-    def getOption(self):
-        """Gets the option ID of the option that the order is for"""
-        return self.option
 
-    def getDateFor(self):
-        """Gets the date that the order is for"""
-        return self.dateFor
+class Option(object):
+    __slots__ = ('id', 'priority', 'priorityScaled')
 
-    def getImportance(self):
-        """Gets the importance value for the order"""
-        return self.importance
-
-
-
-class Option():
     def __init__(self, optionID):
         """Construtor method for the Option class"""
         self.id = optionID
@@ -317,7 +467,9 @@ class Option():
 
     
 
-class Menu():
+class Menu(object):
+    __slots__ = ('id', 'dateFor', 'options', 'temp', 'importance')
+
     def __init__(self, menuID, dateFor, options):
         """Constructor method for the Menu class"""
         self.id = menuID
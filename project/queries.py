@@ -0,0 +1,332 @@
+registry = {}   # Maps the name of each query to its Query object
+
+# Each allergen has its own bit in the allergen masks of the options and students, given by allergens.maskBit
+# An option and a student clash if their masks have any bits in common
+optionAllergenMaskSQL = """
+    COALESCE((
+        SELECT SUM(DISTINCT 1 << allergens.maskBit)
+        FROM option_ingredients, ingredient_allergens, allergens
+        WHERE option_ingredients.ingredientID = ingredient_allergens.ingredientID
+        AND ingredient_allergens.allergenID = allergens.allergenID
+        AND option_ingredients.optionID = options.optionID
+    ), 0)
+"""
+studentAllergenMaskSQL = """
+    COALESCE((
+        SELECT SUM(DISTINCT 1 << allergens.maskBit)
+        FROM student_allergens, allergens
+        WHERE student_allergens.allergenID = allergens.allergenID
+        AND student_allergens.studentID = students.studentID
+    ), 0)
+"""
+
+
+
+class Query():
+    """An SQL statement with a stable name, which the query statistics are grouped by"""
+
+    def __init__(self, name, sql):
+        """Constructor method for the Query class"""
+        self.name = name
+        self.sql = sql
+
+    def __str__(self):
+        return self.sql
+
+    def __repr__(self):
+        return "Query(" + repr(self.name) + ")"
+
+
+
+def defineQuery(name, sql):
+    """Adds a query to the registry, making sure that no two queries share a name"""
+    if name in registry:
+        raise ValueError("A query called " + name + " has already been defined")
+    query = Query(name, sql)
+    registry[name] = query
+    return query
+
+
+
+# Students
+
+studentBalance = defineQuery("studentBalance", """
+    SELECT balance, allergenMask
+    FROM students
+    WHERE studentID = %s
+""")
+
+
+
+# Days and menus
+
+dayIDByTimestamp = defineQuery("dayIDByTimestamp", """
+    SELECT dayID
+    FROM days
+    WHERE timestamp = %s
+""")
+
+optionOnMenu = defineQuery("optionOnMenu", """
+    SELECT 1
+    FROM days, menu_options
+    WHERE days.dayID = menu_options.dayID
+    AND menu_options.optionID = %s
+    AND days.timestamp = %s
+""")
+
+dayMenu = defineQuery("dayMenu", """
+    SELECT options.name, options.price, options.optionID, options.allergenMask
+    FROM days, menu_options, options
+    WHERE days.dayID = menu_options.dayID
+    AND options.optionID = menu_options.optionID
+    AND days.timestamp = %s
+    ORDER BY name
+""")
+
+
+# The menus for every day between two timestamps, so that a week of orders can be checked together
+periodMenus = defineQuery("periodMenus", """
+    SELECT days.timestamp, options.optionID, options.price, options.allergenMask
+    FROM days, menu_options, options
+    WHERE days.dayID = menu_options.dayID
+    AND options.optionID = menu_options.optionID
+    AND days.timestamp >= %s
+    AND days.timestamp < %s
+""")
+
+
+
+# Options and ingredients
+
+allOptions = defineQuery("allOptions", """
+    SELECT *
+    FROM options
+    ORDER BY name
+""")
+
+optionNames = defineQuery("optionNames", """
+    SELECT name, optionID
+    FROM options
+    ORDER BY name
+""")
+
+optionDetails = defineQuery("optionDetails", """
+    SELECT name, price, optionID
+    FROM options
+    WHERE optionID = %s
+""")
+
+optionName = defineQuery("optionName", """
+    SELECT name
+    FROM options
+    WHERE optionID = %s
+""")
+
+addOption = defineQuery("addOption", """
+    INSERT INTO options (name, price)
+    VALUES (%s, %s)
+""")
+
+addOptionIngredient = defineQuery("addOptionIngredient", """
+    INSERT INTO option_ingredients
+    VALUES (%s, %s, %s)
+""")
+
+optionIngredientCosts = defineQuery("optionIngredientCosts", """
+    SELECT ingredients.name, ingredients.pricePerKG, option_ingredients.optionID, option_ingredients.quantity
+    FROM ingredients, option_ingredients
+    WHERE ingredients.ingredientID = option_ingredients.ingredientID
+    ORDER BY name
+""")
+
+allIngredients = defineQuery("allIngredients", """
+    SELECT *
+    FROM ingredients
+    ORDER BY name
+""")
+
+ingredientName = defineQuery("ingredientName", """
+    SELECT name, ingredientID
+    FROM ingredients
+    WHERE ingredientID = %s
+""")
+
+ingredientOptions = defineQuery("ingredientOptions", """
+    SELECT DISTINCT optionID
+    FROM option_ingredients
+    WHERE ingredientID = %s
+""")
+
+allAllergens = defineQuery("allAllergens", """
+    SELECT allergenID, name, maskBit
+    FROM allergens
+    ORDER BY maskBit
+""")
+
+# Works out the allergen mask of an option again, after its ingredients change
+refreshOptionAllergenMask = defineQuery("refreshOptionAllergenMask", """
+    UPDATE options
+    SET allergenMask = """ + optionAllergenMaskSQL + """
+    WHERE optionID = %s
+""")
+
+# Works out the allergen masks of every option containing an ingredient again, after the ingredient's allergens change
+refreshIngredientAllergenMasks = defineQuery("refreshIngredientAllergenMasks", """
+    UPDATE options
+    SET allergenMask = """ + optionAllergenMaskSQL + """
+    WHERE optionID IN (SELECT optionID FROM option_ingredients WHERE ingredientID = %s)
+""")
+
+ingredientAllergens = defineQuery("ingredientAllergens", """
+    SELECT *
+    FROM allergens, ingredient_allergens
+    WHERE allergens.allergenID = ingredient_allergens.allergenID
+    ORDER BY allergens.name
+""")
+
+
+
+# Orders
+
+# Gets the student's details along with their orders between two timestamps, with one record for each order, or a single record with no order if there are none
+studentHome = defineQuery("studentHome", """
+    SELECT students.firstname, students.lastname, students.balance, students.allergenMask, periodOrders.name, periodOrders.optionID, periodOrders.timestamp, periodOrders.orderID
+    FROM students
+    LEFT JOIN (
+        SELECT orders.studentID, options.name, options.optionID, days.timestamp, orders.orderID
+        FROM orders, options, days
+        WHERE orders.optionID = options.optionID
+        AND orders.dayID = days.dayID
+        AND orders.studentID = %s
+        AND days.timestamp >= %s
+        AND days.timestamp < %s
+    ) AS periodOrders ON periodOrders.studentID = students.studentID
+    WHERE students.studentID = %s
+""")
+
+# The days between two timestamps that the student has already ordered for
+studentOrderDays = defineQuery("studentOrderDays", """
+    SELECT days.timestamp
+    FROM orders, days
+    WHERE orders.dayID = days.dayID
+    AND orders.studentID = %s
+    AND days.timestamp >= %s
+    AND days.timestamp < %s
+""")
+
+studentDayOrder = defineQuery("studentDayOrder", """
+    SELECT options.name, options.optionID, orders.orderID
+    FROM orders, options, days
+    WHERE options.optionID = orders.optionID
+    AND days.dayID = orders.dayID
+    AND orders.studentID = %s
+    AND days.timestamp = %s
+""")
+
+orderDetails = defineQuery("orderDetails", """
+    SELECT students.balance, options.price, options.name, days.timestamp
+    FROM students, options, orders, days
+    WHERE students.studentID = orders.studentID
+    AND options.optionID = orders.optionID
+    AND days.dayID = orders.dayID
+    AND orders.orderID = %s
+""")
+
+orderOptionDetails = defineQuery("orderOptionDetails", """
+    SELECT options.name, options.price, orders.orderID
+    FROM options, orders
+    WHERE options.optionID = orders.optionID
+    AND orders.orderID = %s
+""")
+
+# Locks the student's own order, so that it can't be refunded twice
+lockStudentOrder = defineQuery("lockStudentOrder", """
+    SELECT orders.optionID, days.timestamp
+    FROM orders, days
+    WHERE orders.dayID = days.dayID
+    AND orders.orderID = %s
+    AND orders.studentID = %s
+    FOR UPDATE
+""")
+
+# The price is taken off the balance in the database itself, so two orders placed at the same time can't overwrite each other's balance
+# No balance is changed if the option is no longer on the menu for that day, or if the student can no longer afford it
+payForOrder = defineQuery("payForOrder", """
+    UPDATE students
+    SET balance = balance - (SELECT price FROM options WHERE optionID = %s)
+    WHERE studentID = %s
+    AND balance > (SELECT price FROM options WHERE optionID = %s)
+    AND EXISTS (
+        SELECT 1
+        FROM days, menu_options
+        WHERE days.dayID = menu_options.dayID
+        AND menu_options.optionID = %s
+        AND days.timestamp = %s
+    )
+""")
+
+# The difference in price is applied to the balance in the database itself, so it can't overwrite a balance that changed since the page was loaded
+# No balance is changed if the order no longer exists, if the new option isn't on the menu for the order's own day, or if the student can no longer afford it
+payForChange = defineQuery("payForChange", """
+    UPDATE students
+    SET balance = balance
+        + (SELECT options.price FROM orders, options WHERE options.optionID = orders.optionID AND orders.orderID = %s)
+        - (SELECT price FROM options WHERE optionID = %s)
+    WHERE studentID = %s
+    AND (SELECT price FROM options WHERE optionID = %s)
+        - (SELECT options.price FROM orders, options WHERE options.optionID = orders.optionID AND orders.orderID = %s) < balance
+    AND EXISTS (
+        SELECT 1
+        FROM orders, menu_options
+        WHERE menu_options.dayID = orders.dayID
+        AND orders.orderID = %s
+        AND orders.studentID = %s
+        AND menu_options.optionID = %s
+    )
+""")
+
+# Locks the student, so that no other order can be paid for until several orders have been placed together
+lockStudent = defineQuery("lockStudent", """
+    SELECT balance, allergenMask
+    FROM students
+    WHERE studentID = %s
+    FOR UPDATE
+""")
+
+# Takes the total price of several orders off the balance at once, unless the student can't afford them all
+payForOrders = defineQuery("payForOrders", """
+    UPDATE students
+    SET balance = balance - %s
+    WHERE studentID = %s
+    AND balance > %s
+""")
+
+# The refund is added to the balance in the database itself, so it can't overwrite a balance that changed since the page was loaded
+refundOrder = defineQuery("refundOrder", """
+    UPDATE students
+    SET balance = balance + (SELECT price FROM options WHERE optionID = %s)
+    WHERE studentID = %s
+""")
+
+addOrder = defineQuery("addOrder", """
+    INSERT INTO orders (studentID, optionID, dayID)
+    SELECT %s, %s, dayID
+    FROM days
+    WHERE timestamp = %s
+    LIMIT 1
+""")
+
+lastInsertID = defineQuery("lastInsertID", """
+    SELECT LAST_INSERT_ID() AS id
+""")
+
+changeOrder = defineQuery("changeOrder", """
+    UPDATE orders
+    SET optionID = %s
+    WHERE orderID = %s
+""")
+
+deleteOrder = defineQuery("deleteOrder", """
+    DELETE FROM orders
+    WHERE orderID = %s
+""")
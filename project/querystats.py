@@ -0,0 +1,99 @@
+# Part of the Python Standard Library
+import re
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+
+
+logger = logging.getLogger(__name__)
+
+
+
+def getFingerprint(query):
+    """Turns a query into its general form, so that the same query with different values or whitespace is counted together"""
+    fingerprint = re.sub(r"'(?:[^'\\]|\\.|'')*'", "?", query)    # Replaces any string literals
+    fingerprint = re.sub(r"\b\d+(?:\.\d+)?\b", "?", fingerprint)   # Replaces any number literals
+    fingerprint = fingerprint.replace("%s", "?")    # Parameters look the same as literals, since both are values that can change
+    fingerprint = re.sub(r"\s+", " ", fingerprint).strip()
+    return fingerprint
+
+
+
+class QueryStats():
+    """Adds up how long each query takes, separately for each page that runs it, and logs any queries that are slow"""
+
+    def __init__(self, slowThreshold=0.5, slowLogSize=50):
+        """Constructor method for the QueryStats class"""
+        self.slowThreshold = slowThreshold  # Queries that take at least this many seconds in total are logged as slow
+        self.lock = threading.Lock()
+        self.fingerprints = {}  # Remembers the fingerprint of each query string, since most pages run the same strings over and over
+        self.slowLogSize = slowLogSize
+        self.clear()
+
+    def clear(self):
+        """Forgets every statistic that has been recorded"""
+        with self.lock:
+            self.stats = {}     # Maps (fingerprint, page) to the totals for that query on that page
+            self.slowQueries = deque(maxlen=self.slowLogSize)  # The most recent slow queries, newest last
+            self.since = time.time()
+
+    def getFingerprint(self, query):
+        """Gets the fingerprint of a query, working it out if we haven't seen the query before"""
+        fingerprint = self.fingerprints.get(query)
+        if fingerprint is None:
+            fingerprint = getFingerprint(query)
+            if len(self.fingerprints) > 1000:   # Queries built with literal values could otherwise fill up memory
+                self.fingerprints.clear()
+            self.fingerprints[query] = fingerprint
+        return fingerprint
+
+    def record(self, query, page, connectTime, executeTime, fetchTime, rows, name=None):
+        """Adds the timings of one query to the totals. Queries from the queries module are given their name, which they are counted under instead of their fingerprint"""
+        fingerprint = self.getFingerprint(query)
+        totalTime = connectTime + executeTime + fetchTime
+        with self.lock:
+            key = (name or fingerprint, page)
+            if key not in self.stats:
+                self.stats[key] = {'query':fingerprint, 'name':name, 'page':page, 'count':0, 'rows':0, 'totalTime':0.0, 'maxTime':0.0,
+                    'connectTime':0.0, 'executeTime':0.0, 'fetchTime':0.0, 'slowCount':0}
+            stat = self.stats[key]
+            stat['count'] += 1
+            stat['rows'] += rows
+            stat['totalTime'] += totalTime
+            stat['maxTime'] = max(stat['maxTime'], totalTime)
+            stat['connectTime'] += connectTime
+            stat['executeTime'] += executeTime
+            stat['fetchTime'] += fetchTime
+
+            if totalTime >= self.slowThreshold:
+                stat['slowCount'] += 1
+                self.slowQueries.append({'query':fingerprint, 'name':name, 'page':page, 'time':totalTime, 'rows':rows, 'at':time.time()})
+
+        if totalTime >= self.slowThreshold:     # Logging happens outside of the lock, since it may write to a file
+            logger.warning("Slow query on %s took %.3fs (connect %.3fs, execute %.3fs, fetch %.3fs, %d rows): %s",
+                page, totalTime, connectTime, executeTime, fetchTime, rows, name or fingerprint)
+
+    def getAggregates(self):
+        """Gets the totals for every query, with the queries that took the most time in total first"""
+        with self.lock:
+            aggregates = [dict(stat) for stat in self.stats.values()]
+        for stat in aggregates:
+            stat['meanTime'] = stat['totalTime'] / stat['count']
+        aggregates.sort(key=lambda stat: stat['totalTime'], reverse=True)
+        return aggregates
+
+    def getSlowQueries(self):
+        """Gets the most recent slow queries, newest first"""
+        with self.lock:
+            return list(reversed(self.slowQueries))
+
+    def dumpJSON(self):
+        """Gets every statistic as a JSON string"""
+        return json.dumps({'since':self.since, 'slowThreshold':self.slowThreshold, 'queries':self.getAggregates(), 'slowQueries':self.getSlowQueries()})
+
+
+
+queryStats = QueryStats()   # Shared by every request in this process
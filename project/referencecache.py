@@ -0,0 +1,211 @@
+# Part of the Python Standard Library
+import time
+import threading
+from collections import OrderedDict
+
+# Created by me
+import queries
+from versionstamps import versionStamps
+
+
+
+class ReferenceCache():
+    """Remembers the results of queries for reference data, such as the options, ingredients, allergens and each day's menu, which change far less often than they are viewed.
+    Each result is stored with tags describing the data it was made from, so that a manager page that changes some data can invalidate exactly the results that used it.
+    Results also expire after a while, since other processes serving the app can't invalidate this process's cache.
+    """
+
+    def __init__(self, ttl=300, maxSize=512):
+        """Constructor method for the ReferenceCache class"""
+        self.ttl = ttl      # The most seconds a result is used for before it is read from the database again
+        self.maxSize = maxSize  # The most results that will be remembered at once
+        self.entries = OrderedDict()    # Maps each key to an (expiry time, records, tags) tuple, ordered from least to most recently used
+        self.tagged = {}    # Maps each tag to the set of keys of the results that used it
+        self.generation = 0     # Increases whenever anything is invalidated
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def removeEntry(self, key):
+        """Removes a result from the cache, along with its tags. The lock must already be held"""
+        expires, records, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tagged[tag]
+
+    def lookup(self, key):
+        """Gets the cached records for a key, or None if they aren't cached or have expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    self.removeEntry(key)
+                self.misses += 1
+                return None
+            self.entries[key] = self.entries.pop(key)   # Moves the result to the most recently used end
+            self.hits += 1
+            return entry[1]
+
+    def store(self, key, records, tags, generation):
+        """Adds records to the cache, unless something was invalidated since generation, when they started being read"""
+        with self.lock:
+            if generation != self.generation:   # The records might have been read before a change that has since been invalidated
+                return
+            if key in self.entries:
+                self.removeEntry(key)
+            self.entries[key] = (time.time() + self.ttl, records, tags)
+            for tag in tags:
+                self.tagged.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.maxSize:
+                self.removeEntry(next(iter(self.entries)))  # The least recently used result is at the start
+
+    def fetch(self, db, query, params=None, tags=(), recordTags=None):
+        """Gets the records for a query from the cache, or reads them from the database and caches them.
+        Every result gets the given tags, and recordTags can be a function that gives the extra tags for each record.
+        A copy of each record is returned, so that a page can't change the cached records.
+        """
+        key = (query.name, params)
+        records = self.lookup(key)
+        if records is None:
+            generation = self.generation
+            records = db.executeQuery(query, params)
+            allTags = set(tags)
+            if recordTags is not None:
+                for record in records:
+                    allTags.update(recordTags(record))
+            self.store(key, records, allTags, generation)
+        return [dict(record) for record in records]
+
+    def invalidate(self, *tags):
+        """Removes every result that used any of the given tags"""
+        with self.lock:
+            self.generation += 1
+            for tag in tags:
+                for key in list(self.tagged.get(tag, ())):
+                    if key in self.entries:
+                        self.removeEntry(key)
+                self.tagged.pop(tag, None)
+
+    def clear(self):
+        """Removes every result from the cache"""
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.tagged.clear()
+
+
+
+referenceCache = ReferenceCache()   # Shared by every request in this process
+
+
+
+# The tags used for each kind of reference data are:
+#   ("options",)            Any list of every option, which changes when an option is added or removed
+#   ("option", optionID)    Anything showing an option's name, price, ingredients or allergen mask
+#   ("ingredients",)        Any list of ingredients, or of the ingredients in every option
+#   ("ingredient", ingredientID)    Anything showing one ingredient
+#   ("allergens",)          Anything showing the allergens, or which ingredients contain them
+#   ("menu", timestamp)     Anything showing the menu for one day
+
+def optionTags(record):
+    """Tags a record that shows an option"""
+    return [("option", record['optionID'])]
+
+
+def getAllOptions(db):
+    """Gets every option, in alphabetical order"""
+    return referenceCache.fetch(db, queries.allOptions, tags=[("options",)], recordTags=optionTags)
+
+
+def getOptionNames(db):
+    """Gets the name and ID of every option, in alphabetical order"""
+    return referenceCache.fetch(db, queries.optionNames, tags=[("options",)], recordTags=optionTags)
+
+
+def getOption(db, optionID):
+    """Gets the name, price and ID of an option, or None if it doesn't exist"""
+    optionID = int(optionID)
+    records = referenceCache.fetch(db, queries.optionDetails, optionID, tags=[("option", optionID)])
+    if records:
+        return records[0]
+    return None
+
+
+def getOptionIngredientCosts(db):
+    """Gets the name, price per kilogram and quantity of each ingredient in each option"""
+    return referenceCache.fetch(db, queries.optionIngredientCosts, tags=[("options",), ("ingredients",)], recordTags=optionTags)
+
+
+def getAllIngredients(db):
+    """Gets every ingredient, in alphabetical order"""
+    return referenceCache.fetch(db, queries.allIngredients, tags=[("ingredients",)])
+
+
+def getIngredient(db, ingredientID):
+    """Gets the name and ID of an ingredient, or None if it doesn't exist"""
+    ingredientID = int(ingredientID)
+    records = referenceCache.fetch(db, queries.ingredientName, ingredientID, tags=[("ingredient", ingredientID)])
+    if records:
+        return records[0]
+    return None
+
+
+def getIngredientAllergens(db):
+    """Gets each allergen in each ingredient, in alphabetical order of allergen"""
+    return referenceCache.fetch(db, queries.ingredientAllergens, tags=[("ingredients",), ("allergens",)])
+
+
+def getDayMenu(db, timestamp):
+    """Gets the options on the menu for a day, in alphabetical order"""
+    timestamp = int(timestamp)
+    return referenceCache.fetch(db, queries.dayMenu, timestamp, tags=[("menu", timestamp)], recordTags=optionTags)
+
+
+def getAllergens(db):
+    """Gets every allergen, in order of the bit it has in the allergen masks"""
+    return referenceCache.fetch(db, queries.allAllergens, tags=[("allergens",)])
+
+
+
+# Called by the pages that change the reference data, which also change the versions of the menus that show it
+
+def optionAdded():
+    """Invalidates the lists of every option"""
+    referenceCache.invalidate(("options",))
+
+
+def optionChanged(optionID):
+    """Invalidates everything showing an option, after its name, price or ingredients change or it is deleted"""
+    referenceCache.invalidate(("option", int(optionID)), ("options",))
+    versionStamps.bumpAll("menu")   # The option could be on any day's menu
+
+
+def optionsChanged(optionIDs):
+    """Invalidates everything showing any of the options, after the allergens of an ingredient in all of them change"""
+    referenceCache.invalidate(*[("option", int(optionID)) for optionID in optionIDs])
+    versionStamps.bumpAll("menu")
+
+
+def ingredientAdded():
+    """Invalidates the lists of ingredients"""
+    referenceCache.invalidate(("ingredients",))
+
+
+def ingredientChanged(ingredientID):
+    """Invalidates everything showing an ingredient, after its name or price changes or it is deleted"""
+    referenceCache.invalidate(("ingredient", int(ingredientID)), ("ingredients",))
+
+
+def allergensChanged():
+    """Invalidates everything showing which ingredients contain which allergens"""
+    referenceCache.invalidate(("allergens",))
+    versionStamps.bumpAll("menu")   # The menus show the names of the allergens in each option
+
+
+def menuChanged(timestamp):
+    """Invalidates everything showing the menu for a day"""
+    referenceCache.invalidate(("menu", int(timestamp)))
+    versionStamps.bump("menu", int(timestamp))
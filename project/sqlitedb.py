@@ -0,0 +1,192 @@
+# Part of the Python Standard Library
+import re
+import sys
+import sqlite3
+import threading
+from decimal import Decimal
+
+# Created by third-parties
+from pymysql.cursors import DictCursorMixin, SSCursor
+
+
+
+memoryConns = {}    # Every connection to ":memory:" shares one SQLite connection, since each new in-memory connection would be a separate, empty database
+memoryConnsLock = threading.Lock()
+
+STATEMENT_CACHE_SIZE = 256     # Each connection keeps this many statements prepared, looked up by their SQL. It is large enough for every query in the queries module, so they are only parsed once per connection
+
+translations = {}   # Remembers the SQLite version of each query, since pages run the same query strings over and over
+
+# SQLite has no fixed point type, so prices and balances are stored as floats and turned back into two decimal places when they are read, as MySQL returns them
+sqlite3.register_converter("decimal", lambda value: Decimal(value).quantize(Decimal("0.01")))
+sqlite3.register_adapter(Decimal, float)
+
+
+
+def replaceDefaults(query):
+    """Replaces default in the values of an INSERT with NULL, which SQLite turns into a new ID for ID columns. Every other column that we leave as default is nullable"""
+    return re.sub(r"VALUES\s*\(([^)]*)\)", lambda match: "VALUES (" + re.sub(r"\bdefault\b", "NULL", match.group(1)) + ")", query)
+
+
+
+def translateQuery(query):
+    """Rewrites a query written for MySQL so that SQLite can run it"""
+    translated = translations.get(query)
+    if translated is None:
+        translated = query.replace("%s", "?")   # SQLite uses question marks for parameters
+        translated = translated.replace("LAST_INSERT_ID()", "last_insert_rowid()")
+        translated = re.sub(r"\bFOR UPDATE\b", "", translated)  # Transactions already lock the whole database, so there is nothing more to lock
+        translated = replaceDefaults(translated)
+        translations[query] = translated
+    return translated
+
+
+
+def translateScript(script):
+    """Rewrites a MySQL script, such as the ones in testing/data, so that SQLite can run it"""
+    script = re.sub(r"SET FOREIGN_KEY_CHECKS.*?;", "", script)
+    script = replaceDefaults(script)
+    script = re.sub(r'"((?:[^"\\]|\\.)*)"', lambda match: "'" + match.group(1).replace("'", "''") + "'", script)   # MySQL allows double quotes around strings, but SQLite treats them as names
+
+    def translateTable(match):
+        """Rewrites one CREATE TABLE statement, keeping its auto increment column and starting value"""
+        body = match.group(2)
+        autoIncrement = re.search(r"`(\w+)` int\(\d+\) NOT NULL auto_increment", body)
+        if autoIncrement:   # SQLite only allows AUTOINCREMENT on an INTEGER PRIMARY KEY column, so the separate PRIMARY KEY line is removed
+            body = body.replace(autoIncrement.group(0), "`" + autoIncrement.group(1) + "` INTEGER PRIMARY KEY AUTOINCREMENT")
+            body = re.sub(r",\s*PRIMARY KEY\s*\(`" + autoIncrement.group(1) + r"`\)", "", body)
+        statement = "CREATE TABLE " + match.group(1) + " (" + body + ");"
+        if autoIncrement and match.group(3):    # The IDs start from the same value as they do in MySQL
+            statement += "\nINSERT INTO sqlite_sequence (name, seq) VALUES ('" + match.group(1).strip("`") + "', " + str(int(match.group(3)) - 1) + ");"
+        return statement
+
+    script = re.sub(r"CREATE TABLE (`\w+`) \((.*?)\)\s*(?:AUTO_INCREMENT\s*=\s*(\d+))?\s*;", translateTable, script, flags=re.DOTALL)
+    return script.replace("`", '"')
+
+
+
+def loadScripts(path, scriptPaths):
+    """Runs MySQL scripts, such as testing/data/tables.sql followed by a data file, on the SQLite database at path"""
+    conn = SQLiteConnection(path)
+    try:
+        conn.conn.execute("PRAGMA foreign_keys = OFF")  # Like SET FOREIGN_KEY_CHECKS = 0, so that tables can be dropped and filled in any order
+        for scriptPath in scriptPaths:
+            with open(scriptPath) as scriptFile:
+                conn.conn.executescript(translateScript(scriptFile.read()))
+    finally:
+        conn.conn.execute("PRAGMA foreign_keys = ON")
+        conn.close()
+
+
+
+class SQLiteCursor():
+    """Cursor for an SQLite connection that behaves like the PyMySQL cursors used by Database"""
+
+    def __init__(self, conn, tuples, buffered):
+        """Constructor method for the SQLiteCursor class"""
+        self.cursor = conn.cursor()
+        self.tuples = tuples    # If False, records are returned as dictionaries like PyMySQL's DictCursor
+        self.buffered = buffered    # If True, every record is read as soon as the query runs, like PyMySQL's default cursors
+        self.columns = []
+        self.rows = None
+
+    def execute(self, query, params=None):
+        """Runs a query, returning the number of rows it changed or returned like PyMySQL does"""
+        if params is None:
+            params = ()
+        elif not isinstance(params, (tuple, list)):     # PyMySQL accepts a single value on its own, since (value) is not a tuple
+            params = (params,)
+        self.cursor.execute(translateQuery(query), params)
+        if self.cursor.description is None:     # If the query doesn't return any records
+            self.columns = []
+            return self.cursor.rowcount
+        self.columns = [column[0] for column in self.cursor.description]
+        if self.buffered:
+            self.rows = self.cursor.fetchall()
+            return len(self.rows)
+        return -1   # Like an unbuffered cursor, SQLite doesn't know how many records there are until they have all been read
+
+    def makeRecords(self, rows):
+        """Turns rows from SQLite into tuples or dictionaries"""
+        if self.tuples:
+            return rows
+        return [dict(zip(self.columns, row)) for row in rows]
+
+    def fetchall(self):
+        """Gets every remaining record"""
+        if not self.columns:
+            return []
+        if self.buffered:
+            rows = self.rows
+            self.rows = []
+            return self.makeRecords(rows)
+        return self.makeRecords(self.cursor.fetchall())
+
+    def fetchmany(self, size):
+        """Gets up to size of the remaining records"""
+        if not self.columns:
+            return []
+        if self.buffered:
+            rows = self.rows[:size]
+            self.rows = self.rows[size:]
+            return self.makeRecords(rows)
+        return self.makeRecords(self.cursor.fetchmany(size))
+
+    def close(self):
+        """Closes the cursor"""
+        self.cursor.close()
+
+
+
+class SQLiteConnection():
+    """Connection to an SQLite database file that behaves like the PyMySQL connections used by Database, so that the app can run without a MySQL server"""
+
+    def __init__(self, path):
+        """Constructor method for the SQLiteConnection class"""
+        self.path = path
+        if path == ":memory:":
+            with memoryConnsLock:
+                if path not in memoryConns:
+                    memoryConns[path] = sqlite3.connect(path, check_same_thread=False, isolation_level=None, detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=STATEMENT_CACHE_SIZE)
+                self.conn = memoryConns[path]
+        else:
+            self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, detect_types=sqlite3.PARSE_DECLTYPES, timeout=30,
+                cached_statements=STATEMENT_CACHE_SIZE)  # isolation_level=None gives autocommit, like the MySQL connections
+        self.conn.execute("PRAGMA foreign_keys = ON")
+
+    def cursor(self, cursorclass=None):
+        """Creates a cursor that works like the given PyMySQL cursor class, or like a DictCursor if no class is given"""
+        tuples = cursorclass is not None and not issubclass(cursorclass, DictCursorMixin)
+        buffered = cursorclass is None or not issubclass(cursorclass, SSCursor)
+        return SQLiteCursor(self.conn, tuples, buffered)
+
+    def begin(self):
+        """Starts a transaction"""
+        self.conn.execute("BEGIN IMMEDIATE")    # Taking the write lock straight away means two transactions can't both read a balance and then both change it
+
+    def commit(self):
+        """Saves the current transaction"""
+        self.conn.execute("COMMIT")
+
+    def rollback(self):
+        """Undoes the current transaction"""
+        try:
+            self.conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:    # There was no transaction to undo
+            pass
+
+    def ping(self, reconnect=False):
+        """Checks that the connection still works"""
+        self.conn.execute("SELECT 1")
+
+    def close(self):
+        """Closes the connection, unless it is the shared in-memory database"""
+        if self.path != ":memory:":
+            self.conn.close()
+
+
+
+if __name__ == "__main__":
+    # Creates an SQLite database from MySQL scripts, for example:
+    # python sqlitedb.py cafeteria.db ../testing/data/tables.sql ../testing/data/data4.sql
+    loadScripts(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,37 @@
+# Created by me
+import queries
+from referencecache import ReferenceCache
+from versionstamps import studentStamps
+
+
+
+studentCache = ReferenceCache(ttl=60, maxSize=1000)    # Shared by every request in this process. Results are kept for a shorter time than reference data, since there are many more students
+cachedVersions = {}     # Maps each studentID to the shared version that the student's cached results were read at
+
+
+
+def getStudentVersion(studentID):
+    """Gets the version of a student's orders and balance, which every process sees, for use in ETags"""
+    return studentStamps.get("student", int(studentID))
+
+
+def getStudentHome(db, studentID, start, end):
+    """Gets the student's details and their orders from start up to, but not including, end"""
+    studentID = int(studentID)
+    version = getStudentVersion(studentID)
+    if cachedVersions.get(studentID) != version:    # Another process has changed the student since their results were cached here
+        studentCache.invalidate(("student", studentID))
+        cachedVersions[studentID] = version
+    return studentCache.fetch(db, queries.studentHome, (studentID, start, end, studentID), tags=[("student", studentID)])
+
+
+def studentChanged(studentID):
+    """Invalidates everything cached for a student in every process, after their orders or balance change"""
+    studentCache.invalidate(("student", int(studentID)))
+    studentStamps.bump("student", int(studentID))
+
+
+def studentsChanged():
+    """Invalidates everything cached for every student in every process, after a change that refunds many students at once"""
+    studentCache.clear()
+    studentStamps.bumpAll("student")
@@ -1,8 +1,9 @@
 # Part of the Python Standard Library
+import json
 from functools import wraps
 
 # Created by Third Parties
-from flask import redirect, url_for, session
+from flask import redirect, url_for, session, request, make_response, Response
 
 def redirectNonCustomer(webpageCode):   # Decorator function for any pages that require the user to be logged in as a customer
     @wraps(webpageCode) # Necessary because Flask cares what the decorated functions are called
@@ -19,6 +20,17 @@ def redirectNonCustomer(webpageCode):   # Decorator function for any pages that
 
 
 
+def rejectNonCustomer(webpageCode):     # Decorator function for any API endpoints that require the user to be logged in as a customer
+    @wraps(webpageCode) # Necessary because Flask cares what the decorated functions are called
+    def wrapper(*args):  # Wrapper function for the decorator
+        if "userID" not in session:     # API clients can't follow a redirect to a login page, so they are told that they need to log in instead
+            return jsonResponse({"error": "You must be logged in as a customer"}, 401)
+
+        return webpageCode(*args) # Runs the code for the endpoint if the user is logged in
+    return wrapper      # Returns the identifier for wrapper
+
+
+
 def redirectNonManager(webpageCode):    # Decorator function for any pages that require the user to be logged in as a manager
     @wraps(webpageCode) # Necessary because Flask cares what the decorated functions are called
     def wrapper(*args):  # Wrapper function for the decorator
@@ -67,44 +79,44 @@ def clearSession():   # Clears all relevant session variables from the user's de
 
 
 
-def dictMergeSort(listToSort, key):     # Sorts a list of dictionaries by the value for a given key.
-    if len(listToSort) == 0 or len(listToSort) == 1:
-        listSorted = listToSort
-    else:
-        midpoint = len(listToSort)//2
-        list1 = dictMergeSort(listToSort[:midpoint], key)    # Sorts the first half of the list
-        list2 = dictMergeSort(listToSort[midpoint:], key)    # Sorts the second half of the list
-        listSorted = mergeDictLists(list1, list2, key)    # Merges the two sorted halves of the list
+def jsonResponse(data, status=200):     # Turns data into a JSON response, without any spaces so that it is as small as possible
+    return Response(json.dumps(data, separators=(",", ":")), status=status, mimetype="application/json")
 
-    return listSorted
 
 
+def notModified(etag):  # Gets an empty 304 response if the client already has the version of the page given by etag, or None if the page needs to be sent
+    if request.method == "GET" and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    return None
+
 
-def mergeDictLists(list1, list2, key):  # Merges two sorted lists of dictionaries by the value for a given key
-    listMerged = []
-    while len(list1) > 0 and len(list2) > 0:
-        if list1[0][key] < list2[0][key]:
-            element = list1.pop(0)  # Gets the first element of the list while also removing it from the list
-            listMerged.append(element)
-        else:
-            element = list2.pop(0)  # Gets the first element of the list while also removing it from the list
-            listMerged.append(element)
 
-    listMerged += list1 + list2     # It doesn't matter if we add an empty list to the list, so we don't need to check which list is not empty
+def withETag(page, etag):   # Adds an ETag to a page, so that the client can ask whether it has changed next time instead of downloading it again
+    response = make_response(page)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"     # Each page is only for one user, and the client must always check that its copy is up to date
+    return response
 
-    return listMerged
 
 
+def getKeyFunction(key):     # Turns a dictionary key into a function that gets the value for that key, so either can be used for grouping
+    if callable(key):
+        return key
+    return lambda dictionary: dictionary[key]
 
-def findUpperLower(listToSearch, key):
-    indices = {}
-    if len(listToSearch) > 0:   # If the list contains at least 1 element
-        previousValue = listToSearch[0][key]
-        startIndex = 0
-        for i in range(len(listToSearch)):
-            if listToSearch[i][key] != previousValue:   # If we have reached the next value in the list
-                indices[previousValue] = (startIndex, i)
-                startIndex = i
-                previousValue = listToSearch[i][key]
-        indices[previousValue] = (startIndex, len(listToSearch))
-    return indices
\ No newline at end of file
+
+
+def groupDicts(listToGroup, key):   # Groups a list of dictionaries by the value for a given key, or by the result of a given key function
+    # This only goes through the list once, so it is much faster than sorting the list and then finding where each value starts and ends
+    keyFunction = getKeyFunction(key)
+    groups = {}
+    for element in listToGroup:
+        value = keyFunction(element)
+        if value in groups:
+            groups[value].append(element)   # Records keep their original order within each group
+        else:
+            groups[value] = [element]
+    return groups
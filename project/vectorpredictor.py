@@ -0,0 +1,119 @@
+# Part of the Python Standard Library
+import math
+
+# Created by third-parties
+import numpy as np
+
+# Created by me
+from predictor import Predictor
+
+class VectorPredictor(Predictor):
+    """Prediction engine that computes the same quantities as Predictor, but stores the history in NumPy arrays
+    and works on every student at once instead of building an object for each student, order, option and menu
+    """
+
+    def indexIDs(self, records, key):
+        """Gets an array of the IDs in the records and a dictionary mapping each ID to its position in the array"""
+        ids = [record[key] for record in records]
+        positions = {}
+        for i in range(len(ids)):
+            positions[ids[i]] = i
+        return ids, positions
+
+    def calcImportances(self, temps):
+        """Calculates the importance of each temperature in an array using the same bell curve as Order and Menu"""
+        uniqueTemps, inverse = np.unique(temps, return_inverse=True)
+        # The bell curve is only evaluated once per distinct temperature, and math.exp is used so that the values match the other engine exactly
+        kernel = np.array([math.exp(-float((int(temp) - self.predictionTemp)**2)/30) for temp in uniqueTemps], dtype=np.float64)
+        return kernel[inverse]
+
+    def loadOrders(self, orders, studentPositions, optionPositions):
+        """Turns an iterable of order tuples like the ones from iterOrders into arrays of student positions, option positions and temperatures"""
+        studentIndices = []
+        optionIndices = []
+        temps = []
+        for studentID, optionID, dateFor, temp in orders:
+            if studentID in studentPositions:   # Orders from students that no longer exist are ignored, just like in Predictor
+                studentIndices.append(studentPositions[studentID])
+                optionIndices.append(optionPositions.get(optionID, -1))    # -1 marks an order for an option that no longer exists
+                temps.append(temp)
+        return np.array(studentIndices, dtype=np.intp), np.array(optionIndices, dtype=np.intp), np.array(temps, dtype=np.float64)
+
+    def loadMenus(self, daysRaw, menuOptionsRaw, optionPositions):
+        """Turns the menu records into an array of temperatures and arrays of (menu position, option position) pairs"""
+        dayPositions = {}
+        temps = []
+        for day in daysRaw:
+            dayPositions[day['dayID']] = len(temps)
+            temps.append(day['temperature'])
+
+        pairs = set()   # An option is only counted once per menu, like the "in" check in Student.calcOptionPriority
+        for menuOption in menuOptionsRaw:
+            if menuOption['dayID'] in dayPositions and menuOption['optionID'] in optionPositions:
+                pairs.add((dayPositions[menuOption['dayID']], optionPositions[menuOption['optionID']]))
+        pairs = sorted(pairs)   # Sorting by menu position means availability is summed in the same order as Predictor sums it
+
+        menuIndices = np.array([pair[0] for pair in pairs], dtype=np.intp)
+        optionIndices = np.array([pair[1] for pair in pairs], dtype=np.intp)
+        return np.array(temps, dtype=np.float64), menuIndices, optionIndices
+
+    def predict(self):
+        """Begins execution of the vectorised prediction algorithm"""
+
+        # We start by getting all of the data we need from the database
+        studentsRaw = self.getStudents()
+        optionsRaw = self.getOptions()
+        daysRaw = self.getDays()
+        menuOptionsRaw = self.getMenuOptions()
+
+        studentIDs, studentPositions = self.indexIDs(studentsRaw, 'studentID')
+        optionIDs, optionPositions = self.indexIDs(optionsRaw, 'optionID')
+        numStudents = len(studentIDs)
+        numOptions = len(optionIDs)
+
+        orderStudents, orderOptions, orderTemps = self.loadOrders(self.iterOrders(), studentPositions, optionPositions)
+        menuTemps, pairMenus, pairOptions = self.loadMenus(daysRaw, menuOptionsRaw, optionPositions)
+
+        # We set all of the importance values for each order and menu
+        orderImportances = self.calcImportances(orderTemps)
+        menuImportances = self.calcImportances(menuTemps)
+
+        # We calculate the option priorities for each student
+        known = orderOptions >= 0
+        orderCounts = np.zeros((numStudents, numOptions), dtype=np.float64)
+        np.add.at(orderCounts, (orderStudents[known], orderOptions[known]), orderImportances[known])
+        availableCounts = np.bincount(pairOptions, weights=menuImportances[pairMenus], minlength=numOptions)
+        priorities = np.zeros((numStudents, numOptions), dtype=np.float64)
+        available = availableCounts > 0     # Options that were never available keep the lowest priority
+        priorities[:, available] = orderCounts[:, available] / availableCounts[available]
+
+        # We calculate the likelihood of each student placing an order
+        numOrders = np.bincount(orderStudents, minlength=numStudents).astype(np.float64)
+        numMenus = len(daysRaw)
+        if numMenus > 0:
+            orderLikelihoods = numOrders / float(numMenus)
+        else:
+            orderLikelihoods = np.full(numStudents, 0.5)
+
+        # Finally, we calculate the expected quantities of each option on the menu
+        quantities = {}
+        for optionID in self.predictionMenu:
+            quantities[optionID] = 0
+
+        columns = sorted(set(optionPositions[optionID] for optionID in self.predictionMenu if optionID in optionPositions))
+        if len(columns) > 0 and numStudents > 0:
+            menuPriorities = priorities[:, columns]
+            totalPriorityShortlisted = np.zeros(numStudents, dtype=np.float64)
+            for i in range(len(columns)):   # Summed one column at a time so that the additions happen in the same order as in Student.calcExpectedOrders
+                totalPriorityShortlisted += menuPriorities[:, i]
+
+            noPriority = totalPriorityShortlisted == 0     # Students who have not ordered anything on the menu before like everything equally
+            scalars = np.zeros(numStudents, dtype=np.float64)
+            scalars[~noPriority] = orderLikelihoods[~noPriority] / totalPriorityShortlisted[~noPriority]
+            scaled = scalars[:, np.newaxis] * menuPriorities
+            scaled[noPriority, :] = (orderLikelihoods[noPriority] / len(columns))[:, np.newaxis]
+
+            for i in range(len(columns)):   # A cumulative sum adds the students one at a time, in the same order as Predictor.calcExpectedQuantities
+                quantities[optionIDs[columns[i]]] += float(np.cumsum(scaled[:, i])[-1])
+
+        return quantities
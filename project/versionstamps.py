@@ -0,0 +1,113 @@
+# Part of the Python Standard Library
+import os
+import time
+import binascii
+import threading
+
+
+
+class VersionStamps():
+    """Gives each resource, such as a day's menu or a student's orders, a version that changes whenever the resource does.
+    Pages use the versions as ETags, so that they can tell a client that its copy is still up to date without reading the database or rendering anything.
+    Versions also expire after a while, since other processes serving the app can't change this process's versions.
+    """
+
+    def __init__(self, ttl=60):
+        """Constructor method for the VersionStamps class"""
+        self.ttl = ttl      # The most seconds a version is used for before a new one is given out
+        self.prefix = binascii.hexlify(os.urandom(4))   # Versions from another process, or from before a restart, never match this process's versions
+        self.versions = {}  # Maps each (kind, ID) key to a (version, expiry time) tuple
+        self.counter = 0    # Every version is a different number, so a resource never gets back a version it used to have
+        self.lock = threading.Lock()
+
+    def get(self, kind, resourceID):
+        """Gets the current version of a resource, giving it a new one if it doesn't have one or its version has expired"""
+        key = (kind, resourceID)
+        with self.lock:
+            entry = self.versions.get(key)
+            if entry is None or entry[1] < time.time():
+                self.counter += 1
+                entry = (self.prefix + "-" + str(self.counter), time.time() + self.ttl)
+                self.versions[key] = entry
+            return entry[0]
+
+    def bump(self, kind, resourceID):
+        """Changes the version of a resource, after it has changed"""
+        with self.lock:
+            self.versions.pop((kind, resourceID), None)     # The resource gets a new version the next time it is needed
+
+    def bumpAll(self, kind):
+        """Changes the version of every resource of a kind, after a change that affects all of them"""
+        with self.lock:
+            for key in list(self.versions.keys()):
+                if key[0] == kind:
+                    del self.versions[key]
+
+
+
+class SharedVersionStamps():
+    """Gives each resource a version like VersionStamps does, but keeps the versions in files, so that every process serving the app sees the same version.
+    A change made in one process then changes the ETags and cached data in every other process straight away, rather than once their versions expire.
+    """
+
+    def __init__(self, path):
+        """Constructor method for the SharedVersionStamps class"""
+        self.path = path    # The folder that holds one file for each resource's version, and one for each kind's version
+        self.prefix = binascii.hexlify(os.urandom(4))   # Versions written by another process never match this process's versions
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def getFilePath(self, kind, resourceID):
+        """Gets the path of the file holding a resource's version, or the version of every resource of a kind if resourceID is None"""
+        if resourceID is None:
+            return os.path.join(self.path, kind)
+        return os.path.join(self.path, kind + "-" + str(resourceID))
+
+    def readVersion(self, filePath):
+        """Reads a version from its file, or gets None if it hasn't been written yet"""
+        try:
+            with open(filePath) as versionFile:
+                return versionFile.read()
+        except IOError:
+            return None
+
+    def writeVersion(self, filePath):
+        """Writes a new version to a file, returning the version"""
+        with self.lock:
+            self.counter += 1
+            version = self.prefix + "-" + str(self.counter)
+            if not os.path.isdir(self.path):
+                try:
+                    os.makedirs(self.path)
+                except OSError:     # Another process may have made the folder first
+                    pass
+            tempPath = filePath + "." + self.prefix + ".tmp"
+            with open(tempPath, "w") as versionFile:
+                versionFile.write(version)
+            os.rename(tempPath, filePath)   # Renaming is atomic, so a reader never sees a half written version
+        return version
+
+    def get(self, kind, resourceID):
+        """Gets the current version of a resource, giving it one if it doesn't have one yet"""
+        filePath = self.getFilePath(kind, resourceID)
+        version = self.readVersion(filePath)
+        if version is None:
+            version = self.writeVersion(filePath)
+        return (self.readVersion(self.getFilePath(kind, None)) or "0") + "." + version     # Changing every resource of a kind only needs one file to be written
+
+    def bump(self, kind, resourceID):
+        """Changes the version of a resource, after it has changed"""
+        self.writeVersion(self.getFilePath(kind, resourceID))
+
+    def bumpAll(self, kind):
+        """Changes the version of every resource of a kind, after a change that affects all of them"""
+        self.writeVersion(self.getFilePath(kind, None))
+
+
+
+versionStamps = VersionStamps()     # Shared by every request in this process
+studentStamps = SharedVersionStamps(os.path.join(os.path.dirname(os.path.abspath(__file__)), "versionstamps"))   # Shared by every process, since any of them can change a student's orders
+
+# The kinds of resource are:
+#   "menu"      The menu for a day, given by its timestamp, including the names, prices and allergens of its options. Kept in versionStamps
+#   "student"   A student's orders and balance, given by their studentID. Kept in studentStamps
@@ -0,0 +1,22 @@
+import time
+
+from predictor import Predictor
+from vectorpredictor import VectorPredictor
+
+today = 1578528000
+
+menu = []
+for i in range(5):
+    menu.append(int(raw_input()))
+
+results = []
+for engine in (Predictor, VectorPredictor):
+    time1 = time.time()
+    pd = engine(today, 20, menu)
+    pd.connectDB("localhost", "pi", "raspberry", "cafeteria")
+    results.append(pd.predict())
+    time2 = time.time()
+    print(engine.__name__ + ": " + str(results[-1]))
+    print(str(time2-time1) + " seconds")
+
+print(results[0] == results[1])
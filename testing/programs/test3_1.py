@@ -1,4 +0,0 @@
-from tools import dictMergeSort
-
-dictionary = [{"a":1, "b":5}, {"a":5, "b":7}, {"a":4, "b":3}, {"a":2, "b":2}, {"a":3, "b":9}]
-print(dictMergeSort(dictionary, "a"))
\ No newline at end of file
@@ -1,5 +0,0 @@
-from tools import findUpperLower
-
-test = [{"a":1}, {"a":1}, {"a":3}, {"a":3}, {"a":3}, {"a":4}, {"a":4}, {"a":5}, {"a":5}, {"a":5}, {"a":5}, {"a":6}]
-result = findUpperLower(test, "a")
-print(result)
\ No newline at end of file
@@ -0,0 +1,239 @@
+# Checks that every prediction engine gives the same quantities, that orders and balances change together, and that cached pages and menus see every change.
+# It makes its own SQLite database from the test data, so it doesn't need the MySQL server or CAFETERIA_SQLITE to be set
+
+# Part of the Python Standard Library
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+PROJECT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "project")
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+workPath = tempfile.mkdtemp()
+os.environ["CAFETERIA_SQLITE"] = os.path.join(workPath, "cafeteria.db")    # Must be set before the database module is imported
+sys.path.insert(0, PROJECT_PATH)
+
+# Created by me
+from sqlitedb import loadScripts
+from database import Database
+from migrations import migrate
+from modelstate import ModelState
+from predictor import Predictor
+from vectorpredictor import VectorPredictor
+import pages.webpage
+
+today = 1578528000      # The same artificial timestamp that the pages use
+nextMonday = 1578873600     # The first day of the second week, which customers can order for
+failures = []
+
+
+def check(description, passed):
+    """Prints the result of a check and remembers it if it failed"""
+    print(("PASS " if passed else "FAIL ") + description)
+    if not passed:
+        failures.append(description)
+
+
+def sameQuantities(quantities1, quantities2):
+    """Checks whether two predictions have the same options and the same quantities, apart from rounding errors"""
+    return sorted(quantities1.keys()) == sorted(quantities2.keys()) and all(abs(quantities1[optionID] - quantities2[optionID]) < 1e-6 for optionID in quantities1)
+
+
+loadScripts(os.environ["CAFETERIA_SQLITE"], [os.path.join(DATA_PATH, "tables.sql"), os.path.join(DATA_PATH, "data4.sql")])
+db = Database("localhost", "pi", "raspberry", "cafeteria", keepOpen=True, source="Test4")
+migrate(db)
+
+
+
+print("Prediction engines")
+
+menu = [record['optionID'] for record in db.executeQuery("SELECT optionID FROM options ORDER BY optionID LIMIT 5")]
+state = ModelState(None)    # The tallies that the pages keep, built from the same days as predict
+state.rebuild(db, today)
+
+for temp in (5, 20, 30):
+    pd = Predictor(today, temp, menu)
+    pd.setDB(db)
+    expected = pd.predict()
+
+    vpd = VectorPredictor(today, temp, menu)
+    vpd.setDB(db)
+
+    check("predictFromState matches predict at " + str(temp) + " degrees", sameQuantities(pd.predictFromState(state), expected))
+    check("predictAggregated matches predict at " + str(temp) + " degrees", sameQuantities(pd.predictAggregated(), expected))
+    check("predictMany matches predict at " + str(temp) + " degrees", sameQuantities(pd.predictMany([(menu, temp)])[0], expected))
+    check("VectorPredictor matches predict at " + str(temp) + " degrees", sameQuantities(vpd.predict(), expected))
+
+
+
+print("Orders")
+
+originalInit = pages.webpage.Webpage.__init__
+def testInit(self):
+    """Keeps the pages' model state snapshot in the temporary folder"""
+    originalInit(self)
+    self.MODEL_STATE_PATH = os.path.join(workPath, "modelstate.json")
+pages.webpage.Webpage.__init__ = testInit
+
+import app as appModule
+import studentcache
+from versionstamps import studentStamps, SharedVersionStamps
+studentStamps.path = os.path.join(workPath, "versionstamps")
+appModule.app.testing = True
+
+studentID = 1005
+student = db.executeQuery("SELECT password, allergenMask FROM students WHERE studentID = %s", (studentID,))[0]
+db.executeQuery("UPDATE students SET balance = 20 WHERE studentID = %s", (studentID,))
+
+def getBalance():
+    return round(float(db.executeQuery("SELECT balance FROM students WHERE studentID = %s", (studentID,))[0]['balance']), 2)
+
+def getDayOrder(dateTS):
+    orderQuery = """
+        SELECT orders.orderID, orders.optionID
+        FROM orders, days
+        WHERE orders.dayID = days.dayID
+        AND orders.studentID = %s
+        AND days.timestamp = %s
+    """
+    return db.executeQuery(orderQuery, (studentID, dateTS))
+
+def getMenu(dateTS):
+    menuQuery = """
+        SELECT options.optionID, options.price
+        FROM options, menu_options, days
+        WHERE options.optionID = menu_options.optionID
+        AND menu_options.dayID = days.dayID
+        AND days.timestamp = %s
+        AND options.allergenMask & %s = 0
+        ORDER BY options.optionID
+    """
+    return db.executeQuery(menuQuery, (dateTS, student['allergenMask']))
+
+customer = appModule.app.test_client()
+customer.post("/login", data={"userID": str(studentID), "password": student['password']})
+manager = appModule.app.test_client()
+manager.post("/login-hidden", data={"authCode": "test"})
+
+options = getMenu(nextMonday)
+firstPrice = round(float(options[0]['price']), 2)
+secondPrice = round(float(options[1]['price']), 2)
+
+weekETag = customer.get("/api/week?week=1").headers["ETag"]
+homePage = customer.post("/home", data={"changeWeek": "1"}).data    # Fills the student's cache for the second week
+
+response = customer.post("/api/orders", data={"option": options[0]['optionID'], "date": nextMonday})
+check("an order can be placed", response.status_code == 201 and len(getDayOrder(nextMonday)) == 1)
+check("placing an order takes its price from the balance", getBalance() == round(20 - firstPrice, 2))
+check("the week changes its ETag after an order is placed", customer.get("/api/week?week=1", headers={"If-None-Match": weekETag}).status_code == 200)
+check("the home page shows the new order", customer.get("/home").data != homePage)
+orderID = getDayOrder(nextMonday)[0]['orderID']
+
+response = customer.put("/api/orders/" + str(orderID), data={"option": options[1]['optionID']})
+check("an order can be changed", response.status_code == 200 and getDayOrder(nextMonday)[0]['optionID'] == options[1]['optionID'])
+check("changing an order charges or refunds the difference", getBalance() == round(20 - secondPrice, 2))
+
+otherDay = [record['optionID'] for record in db.executeQuery("SELECT optionID FROM options") if record['optionID'] not in [option['optionID'] for option in getMenu(nextMonday)]]
+response = customer.post("/change-order", data={"orderConfirm": "1", "currOrderID": str(orderID), "optionID": str(otherDay[0]), "dateFor": str(nextMonday)})
+check("an order can't be changed to an option that isn't on its day", response.status_code == 200 and getDayOrder(nextMonday)[0]['optionID'] == options[1]['optionID'] and getBalance() == round(20 - secondPrice, 2))
+
+db.executeQuery("UPDATE students SET balance = 0 WHERE studentID = %s", (studentID,))
+studentcache.studentChanged(studentID)
+tuesdayOptions = getMenu(nextMonday + 86400)
+response = customer.post("/api/orders", data={"option": tuesdayOptions[0]['optionID'], "date": nextMonday + 86400})
+check("an order that can't be paid for isn't placed", response.status_code == 409 and len(getDayOrder(nextMonday + 86400)) == 0 and getBalance() == 0)
+db.executeQuery("UPDATE students SET balance = %s WHERE studentID = %s", (20 - secondPrice, studentID))
+studentcache.studentChanged(studentID)
+
+response = customer.delete("/api/orders/" + str(orderID))
+check("deleting an order refunds it", response.status_code == 204 and len(getDayOrder(nextMonday)) == 0 and getBalance() == 20)
+check("deleting an order twice doesn't refund it twice", customer.delete("/api/orders/" + str(orderID)).status_code == 404 and getBalance() == 20)
+
+wednesday = nextMonday + 2*86400
+customer.get("/api/week?week=1")    # Caches the week without an order on Wednesday
+db.executeQuery("INSERT INTO orders (studentID, optionID, dayID) SELECT %s, menu_options.optionID, days.dayID FROM menu_options, days WHERE menu_options.dayID = days.dayID AND days.timestamp = %s LIMIT 1", (studentID, wednesday))   # As if another process had placed it
+response = customer.post("/api/orders", data={"option": getMenu(wednesday)[0]['optionID'], "date": wednesday})
+check("a second order for a day is refused even if the cache hasn't seen the first", response.status_code == 409 and len(getDayOrder(wednesday)) == 1 and getBalance() == 20)
+db.executeQuery("DELETE FROM orders WHERE orderID = %s", (getDayOrder(wednesday)[0]['orderID'],))
+studentcache.studentChanged(studentID)
+
+samePrice = None    # Two options on the same day with the same price, so that changing between them leaves the balance as it is
+for day in range(5):
+    dayOptions = getMenu(nextMonday + day*86400)
+    for option1 in dayOptions:
+        for option2 in dayOptions:
+            if option1['optionID'] != option2['optionID'] and option1['price'] == option2['price'] and samePrice is None:
+                samePrice = (nextMonday + day*86400, option1, option2)
+if samePrice is not None:
+    dateTS, option1, option2 = samePrice
+    orderID = json.loads(customer.post("/api/orders", data={"option": option1['optionID'], "date": dateTS}).data)['order']
+    balance = getBalance()
+    response = customer.put("/api/orders/" + str(orderID), data={"option": option2['optionID']})
+    check("an order can be changed to an option with the same price", response.status_code == 200 and getDayOrder(dateTS)[0]['optionID'] == option2['optionID'] and getBalance() == balance)
+    customer.post("/change-order", data={"orderConfirm": "1", "currOrderID": str(orderID), "optionID": str(option1['optionID'])})
+    check("the change order page can change to an option with the same price", getDayOrder(dateTS)[0]['optionID'] == option1['optionID'] and getBalance() == balance)
+    customer.delete("/api/orders/" + str(orderID))
+
+for day in range(5):
+    dayOptions = sorted(getMenu(nextMonday + day*86400), key=lambda option: option['price'])
+    if dayOptions and dayOptions[-1]['price'] > dayOptions[0]['price']:    # A day where the order can be changed to something more expensive
+        dateTS = nextMonday + day*86400
+        balance = getBalance()
+        orderID = json.loads(customer.post("/api/orders", data={"option": dayOptions[0]['optionID'], "date": dateTS}).data)['order']
+        db.executeQuery("UPDATE students SET balance = 0 WHERE studentID = %s", (studentID,))
+        studentcache.studentChanged(studentID)
+        response = customer.post("/change-order", data={"orderConfirm": "1", "currOrderID": str(orderID), "optionID": str(dayOptions[-1]['optionID']), "dateFor": str(dateTS)})
+        check("a change that can't be paid for shows the change page again with an alert", response.status_code == 200 and "balance is too low" in response.data)
+        check("a change that can't be paid for leaves the order and balance as they were", getDayOrder(dateTS)[0]['optionID'] == dayOptions[0]['optionID'] and getBalance() == 0)
+        db.executeQuery("UPDATE students SET balance = %s WHERE studentID = %s", (balance - float(dayOptions[0]['price']), studentID))
+        studentcache.studentChanged(studentID)
+        customer.delete("/api/orders/" + str(orderID))
+        break
+
+choices = {"bulkConfirm": "1"}
+total = 0
+for day in range(5):
+    dayOptions = getMenu(nextMonday + day*86400)
+    if dayOptions:
+        choices["option" + str(nextMonday + day*86400)] = str(dayOptions[0]['optionID'])
+        total += round(float(dayOptions[0]['price']), 2)
+db.executeQuery("UPDATE students SET balance = %s WHERE studentID = %s", (total - 0.01, studentID))
+studentcache.studentChanged(studentID)
+customer.post("/bulk-order", data=choices)
+check("a week that can't be paid for in full isn't ordered at all", all(len(getDayOrder(nextMonday + day*86400)) == 0 for day in range(5)))
+db.executeQuery("UPDATE students SET balance = %s WHERE studentID = %s", (total + 1, studentID))    # SQLite stores prices as floats, so an exact balance could be a rounding error short
+studentcache.studentChanged(studentID)
+customer.post("/bulk-order", data=choices)
+check("a week can be ordered at once", len([key for key in choices if key.startswith("option")]) == sum(len(getDayOrder(nextMonday + day*86400)) for day in range(5)) and getBalance() == 1)
+
+
+homeETag = customer.get("/home").headers["ETag"]
+orderID = getDayOrder(nextMonday)[0]['orderID']
+db.executeQuery("DELETE FROM orders WHERE orderID = %s", (orderID,))
+SharedVersionStamps(studentStamps.path).bump("student", studentID)     # Like another process deleting the order, which can't clear this process's cache
+response = customer.get("/home", headers={"If-None-Match": homeETag})
+check("the home page sees an order deleted by another process", response.status_code == 200 and response.data != homePage and response.headers["ETag"] != homeETag)
+check("the week sees an order deleted by another process", all(day['date'] != nextMonday or "order" not in day for day in json.loads(customer.get("/api/week?week=1").data)['days']))
+
+
+
+print("Menus")
+
+menuETag = customer.get("/api/menu/" + str(nextMonday)).headers["ETag"]
+check("an unchanged menu isn't sent again", customer.get("/api/menu/" + str(nextMonday), headers={"If-None-Match": menuETag}).status_code == 304)
+manager.post("/manage-menus/edit", data={"addConfirm": "1", "optionID": str(otherDay[0]), "dateFor": str(nextMonday)})
+response = customer.get("/api/menu/" + str(nextMonday), headers={"If-None-Match": menuETag})
+check("a menu changed by the manager is sent again with the new option", response.status_code == 200 and otherDay[0] in [option['id'] for option in json.loads(response.data)['options']])
+check("the order page shows the new option", ('value="' + str(otherDay[0]) + '"') in customer.post("/add-order", data={"dateFor": str(nextMonday)}).data)
+
+
+
+db.closeConn()
+shutil.rmtree(workPath)
+
+if failures:
+    print(str(len(failures)) + " checks failed")
+    sys.exit(1)
+print("All checks passed")